@@ -8,20 +8,27 @@ from fastapi import (
     Request,
     Header,
     BackgroundTasks,
+    Query,
 )
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import ORJSONResponse, Response
 from typing import List, Optional, Dict, Any
 import uvicorn
 from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
 import os
 import logging
+import asyncio
 import json
+import orjson
 import random
 import re
+import io
+import queue
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,8 +37,11 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
+# Greedy match for the outermost JSON object in an AI response
+_JSON_RE = re.compile(r"\{.*\}", re.DOTALL)
+
 from services.ocr_service import OCRService
-from services.ai_service import AIService
+from services.ai_service import AIService, close_http_client
 from services.rag_service import RAGService
 from services.perplexity_service import PerplexityService
 from services.supabase_service import SupabaseService
@@ -45,7 +55,11 @@ from models.schemas import (
     UserWeaknessUpdate,
 )
 
-app = FastAPI(title="Personalized Learning Platform API", version="1.0.0")
+app = FastAPI(
+    title="Personalized Learning Platform API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+)
 
 # CORS middleware - must be before routes
 # Allow all origins for ngrok backend (can be restricted in production)
@@ -66,6 +80,18 @@ perplexity_service = PerplexityService()
 supabase_service = SupabaseService()
 
 
+@app.on_event("shutdown")
+async def shutdown_ai_client():
+    """Release pooled connections to the AI API"""
+    await close_http_client()
+
+
+@app.on_event("shutdown")
+async def flush_rag_writes():
+    """Write any batched RAG documents before the process exits"""
+    await rag_service.flush()
+
+
 @app.get("/")
 async def root():
     return {"message": "Personalized Learning Platform API", "status": "running"}
@@ -101,6 +127,8 @@ async def analyze_midterm(
         file_content = await file.read()
         extracted_text = await ocr_service.extract_text(file_content, file.filename)
         logger.info(f"Extracted {len(extracted_text)} characters from midterm paper")
+        # Only the first 5000 characters are analyzed and stored; slice once, up front
+        paper_text = extracted_text[:5000]
 
         # Step 2: Use AI to analyze the midterm with enhanced prompt
         analysis_prompt = f"""
@@ -120,7 +148,7 @@ For EACH question in the paper (including correct ones), identify:
 8. Detailed feedback (explain what was right/wrong)
 
 Midterm paper content (extracted via OCR):
-{extracted_text[:5000]}
+{paper_text}
 
 IMPORTANT: Return ONLY a valid JSON array. No markdown, no code blocks, no explanations. Just pure JSON starting with [ and ending with ].
 
@@ -143,7 +171,7 @@ Return ONLY the JSON array, nothing else.
 
         logger.info("Calling AI service to analyze midterm paper...")
         ai_response = await ai_service.generate_response(
-            analysis_prompt, temperature=0.3, max_tokens=4096
+            analysis_prompt, temperature=0.3, max_tokens=4096, cache=True
         )
         logger.info(f"AI response received, length: {len(ai_response)}")
 
@@ -265,7 +293,7 @@ Return ONLY the JSON array, nothing else.
             filename=file.filename,
             course_name=course_name or "Unknown",
             errors=errors,  # Only errors (no correct answers) for display
-            extracted_text=extracted_text,
+            extracted_text=paper_text,
             recommended_resources=recommended_resources,
             error_topics=topics_with_errors,
             all_questions=all_questions,  # Pass all questions for accurate stats
@@ -283,7 +311,7 @@ Return ONLY the JSON array, nothing else.
         logger.info(
             f"Midterm analysis complete: {len(errors)} errors, {len(recommended_resources)} resources"
         )
-        return JSONResponse(content=result)
+        return ORJSONResponse(content=result)
 
     except Exception as e:
         logger.error(f"Midterm analysis error: {str(e)}", exc_info=True)
@@ -416,7 +444,9 @@ Example format (note how correct answers are in different positions):
 Generate {request.num_questions} questions. Vary the correct answer position randomly (a, b, c, or d) for each question. Return ONLY the JSON array, nothing else."""
 
         logger.info("Calling AI service to generate quiz questions...")
-        ai_response = await ai_service.generate_response(quiz_prompt)
+        ai_response = await ai_service.generate_array_response(
+            quiz_prompt, min_items=request.num_questions
+        )
         logger.info(f"AI response received, length: {len(ai_response)}")
 
         # Log response for debugging (first and last 500 chars)
@@ -514,7 +544,7 @@ Generate {request.num_questions} questions. Vary the correct answer position ran
         }
 
         logger.info(f"Quiz generation successful, returning {len(questions)} questions")
-        return JSONResponse(content=result)
+        return ORJSONResponse(content=result)
 
     except HTTPException:
         raise
@@ -585,8 +615,8 @@ Vary the correct answer position randomly (a, b, c, or d) for each question. Ret
         logger.info("Calling AI service to generate quiz from error topics...")
         # Increase max_tokens to reduce truncation for longer quizzes
         # 10 questions with full text can be ~6000-8000 tokens
-        ai_response = await ai_service.generate_response(
-            quiz_prompt, temperature=0.7, max_tokens=8192
+        ai_response = await ai_service.generate_array_response(
+            quiz_prompt, temperature=0.7, max_tokens=8192, min_items=num_questions
         )
         logger.info(f"AI response received, length: {len(ai_response)}")
 
@@ -750,7 +780,7 @@ Vary the correct answer position randomly (a, b, c, or d) for each question. Ret
         logger.info(
             f"Quiz generation from errors successful, returning {len(questions)} questions"
         )
-        return JSONResponse(content=result)
+        return ORJSONResponse(content=result)
 
     except HTTPException:
         raise
@@ -805,7 +835,7 @@ IMPORTANT: Only return resources that are completely free to access, no paywalls
         )
 
         result = {"materials": materials}
-        return JSONResponse(content=result)
+        return ORJSONResponse(content=result)
 
     except Exception as e:
         logger.error(f"Material search error: {str(e)}", exc_info=True)
@@ -867,13 +897,13 @@ async def get_quiz_result(quiz_id: str, user_id: str):
             # Try to continue without quiz data
 
         # Get result
-        results = await supabase_service.get_user_quiz_results(user_id)
+        results = await supabase_service.get_user_quiz_results(user_id, limit=None)
         result = next((r for r in results if r.get("quiz_id") == quiz_id), None)
 
         if not result:
             logger.warning(f"No result found for quiz_id={quiz_id}")
             # Return empty result if not found
-            return JSONResponse(
+            return ORJSONResponse(
                 content={"quiz": quiz, "result": None, "recommendations": []}
             )
 
@@ -891,7 +921,7 @@ async def get_quiz_result(quiz_id: str, user_id: str):
             except Exception as e:
                 logger.warning(f"Failed to get recommendations: {str(e)}")
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={"quiz": quiz, "result": result, "recommendations": recommendations}
         )
 
@@ -926,7 +956,7 @@ async def get_quiz_result_by_id(result_id: str, user_id: str):
         # Get recommendations from result if available
         recommendations = result.get("recommended_resources", [])
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={"quiz": quiz, "result": result, "recommendations": recommendations}
         )
     except Exception as e:
@@ -947,7 +977,7 @@ async def get_midterm_analysis_by_id(analysis_id: str, user_id: str):
 
         analysis = await supabase_service.get_midterm_analysis(analysis_id, user_id)
 
-        return JSONResponse(content=analysis)
+        return ORJSONResponse(content=analysis)
     except Exception as e:
         logger.error(f"Failed to get midterm analysis by ID: {str(e)}", exc_info=True)
         raise HTTPException(
@@ -966,6 +996,40 @@ async def get_user_quizzes(user_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to get quizzes: {str(e)}")
 
 
+@app.get("/api/user/{user_id}/quiz-results")
+async def get_user_quiz_results(
+    user_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+):
+    """Get one page of a user's quiz results, newest first"""
+    try:
+        return await supabase_service.get_user_quiz_results(
+            user_id, offset=offset, limit=limit
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to get quiz results: {str(e)}"
+        )
+
+
+@app.get("/api/user/{user_id}/midterm-analyses")
+async def get_user_midterm_analyses(
+    user_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+):
+    """Get one page of a user's midterm analyses, newest first"""
+    try:
+        return await supabase_service.get_user_midterm_analyses(
+            user_id, offset=offset, limit=limit
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Failed to get midterm analyses: {str(e)}"
+        )
+
+
 @app.get("/api/user/{user_id}/progress")
 async def get_user_progress(user_id: str):
     """Get user progress data for dashboard"""
@@ -974,8 +1038,11 @@ async def get_user_progress(user_id: str):
 
         # Get quizzes and results
         quizzes = await supabase_service.get_user_quizzes(user_id)
-        quiz_results = await supabase_service.get_user_quiz_results(user_id)
-        midterm_analyses = await supabase_service.get_user_midterm_analyses(user_id)
+        # Stats cover the user's whole history, not just the first page
+        quiz_results = await supabase_service.get_user_quiz_results(user_id, limit=None)
+        midterm_analyses = await supabase_service.get_user_midterm_analyses(
+            user_id, limit=None
+        )
 
         # Calculate weekly goals
         from datetime import datetime, timedelta, timezone
@@ -1386,7 +1453,7 @@ async def extract_topics_from_material(
 
         try:
             ai_response = await ai_service.generate_response(
-                prompt, temperature=0.3, max_tokens=4096
+                prompt, temperature=0.3, max_tokens=4096, cache=True
             )
             logger.info(
                 f"AI response length: {len(ai_response) if ai_response else 0} characters"
@@ -1489,7 +1556,7 @@ async def extract_topics_from_material(
             else:
                 subject = "General"
 
-            return JSONResponse(
+            return ORJSONResponse(
                 content={
                     "topics": topics,
                     "subject": subject,
@@ -1502,7 +1569,7 @@ async def extract_topics_from_material(
         )
         if json_match:
             try:
-                data = json.loads(json_match.group(0))
+                data = orjson.loads(json_match.group(0))
                 subject = data.get("subject", "General")
                 topics = data.get("topics", [])
             except json.JSONDecodeError:
@@ -1512,7 +1579,7 @@ async def extract_topics_from_material(
                     r",(\s*[}\]])", r"\1", json_str
                 )  # Remove trailing commas
                 try:
-                    data = json.loads(json_str)
+                    data = orjson.loads(json_str)
                     subject = data.get("subject", "General")
                     topics = data.get("topics", [])
                 except:
@@ -1602,7 +1669,7 @@ async def extract_topics_from_material(
         except Exception as e:
             logger.warning(f"Failed to store material: {str(e)}")
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "topics": topics,
                 "subject": subject,
@@ -1664,7 +1731,7 @@ async def save_quiz_result(request: dict):
             except Exception as e:
                 logger.warning(f"Failed to update RAG weaknesses: {str(e)}")
 
-        return JSONResponse(content={"message": "Quiz result saved successfully"})
+        return ORJSONResponse(content={"message": "Quiz result saved successfully"})
 
     except Exception as e:
         logger.error(f"Failed to save quiz result: {str(e)}", exc_info=True)
@@ -1685,7 +1752,7 @@ async def save_quiz_summary(request: dict):
         try:
             # Get the most recent quiz result for this quiz_id
             results = await supabase_service.get_user_quiz_results(
-                request.get("user_id")
+                request.get("user_id"), columns="id,quiz_id", limit=None
             )
             result = next(
                 (r for r in results if r.get("quiz_id") == request.get("quiz_id")), None
@@ -1714,6 +1781,9 @@ async def save_quiz_summary(request: dict):
                         .eq("user_id", request.get("user_id"))
                         .execute()
                     )
+                    supabase_service.forget_quiz_result(
+                        result["id"], request.get("user_id")
+                    )
 
                     if update_result.data:
                         logger.info(
@@ -1753,7 +1823,7 @@ async def save_quiz_summary(request: dict):
         except Exception as e:
             logger.warning(f"Failed to save quiz summary: {str(e)}")
 
-        return JSONResponse(content={"message": "Quiz summary saved successfully"})
+        return ORJSONResponse(content={"message": "Quiz summary saved successfully"})
 
     except Exception as e:
         logger.error(f"Failed to save quiz summary: {str(e)}", exc_info=True)
@@ -1775,11 +1845,14 @@ async def get_rag_progress(user_id: str):
         logger.info(f"Generating RAG-based progress analysis for user: {user_id}")
 
         # Get all user data from Supabase
-        quiz_results = await supabase_service.get_user_quiz_results(user_id)
-        midterm_analyses = await supabase_service.get_user_midterm_analyses(user_id)
+        # Stats cover the user's whole history, not just the first page
+        quiz_results = await supabase_service.get_user_quiz_results(user_id, limit=None)
+        midterm_analyses = await supabase_service.get_user_midterm_analyses(
+            user_id, limit=None
+        )
 
         if not quiz_results and not midterm_analyses:
-            return JSONResponse(
+            return ORJSONResponse(
                 content={
                     "overall_accuracy": 0,
                     "total_quizzes": 0,
@@ -1867,9 +1940,9 @@ async def get_rag_progress(user_id: str):
         try:
             import json
 
-            json_match = re.search(r"\{.*\}", ai_response, re.DOTALL)
+            json_match = _JSON_RE.search(ai_response)
             if json_match:
-                ai_analysis = json.loads(json_match.group(0))
+                ai_analysis = orjson.loads(json_match.group(0))
             else:
                 # Fallback parsing
                 ai_analysis = {
@@ -1903,7 +1976,7 @@ async def get_rag_progress(user_id: str):
                     ),
                 }
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "overall_accuracy": round(overall_accuracy, 1),
                 "total_quizzes": len(quiz_results),
@@ -1952,7 +2025,7 @@ async def get_rag_resources(user_id: str):
                 logger.info(
                     f"Returning cached resources for user {user_id} (no new data since cache)"
                 )
-                return JSONResponse(
+                return ORJSONResponse(
                     content={
                         "resources": cached_resources.get("resources", []),
                         "recommended_topics": cached_resources.get(
@@ -1973,8 +2046,11 @@ async def get_rag_resources(user_id: str):
 
         # Get all user data (needed for regeneration)
         logger.info(f"Generating new resources for user: {user_id}")
-        quiz_results = await supabase_service.get_user_quiz_results(user_id)
-        midterm_analyses = await supabase_service.get_user_midterm_analyses(user_id)
+        # Stats cover the user's whole history, not just the first page
+        quiz_results = await supabase_service.get_user_quiz_results(user_id, limit=None)
+        midterm_analyses = await supabase_service.get_user_midterm_analyses(
+            user_id, limit=None
+        )
         weaknesses = await rag_service.get_user_weaknesses(user_id)
 
         # Aggregate all weak topics with subject context
@@ -2046,7 +2122,7 @@ async def get_rag_resources(user_id: str):
             topics_by_subject["General"].update(weaknesses["topics"])
 
         if not all_weak_topics:
-            return JSONResponse(
+            return ORJSONResponse(
                 content={
                     "resources": [],
                     "recommended_topics": [],
@@ -2084,11 +2160,10 @@ async def get_rag_resources(user_id: str):
 
         try:
             import json
-            import re
 
-            json_match = re.search(r"\{.*\}", ai_response, re.DOTALL)
+            json_match = _JSON_RE.search(ai_response)
             if json_match:
-                ai_analysis = json.loads(json_match.group(0))
+                ai_analysis = orjson.loads(json_match.group(0))
             else:
                 ai_analysis = {
                     "learning_path": "Focus on all weak areas across different subjects equally",
@@ -2208,7 +2283,7 @@ async def get_rag_resources(user_id: str):
             )
             logger.info(f"Cached resources for user {user_id}")
 
-        return JSONResponse(content=resources_response)
+        return ORJSONResponse(content=resources_response)
 
     except Exception as e:
         logger.error(f"Failed to get RAG resources: {str(e)}", exc_info=True)
@@ -2227,8 +2302,11 @@ async def generate_rag_quiz(user_id: str, num_questions: int = 10):
         logger.info(f"Generating RAG-based quiz for user: {user_id}")
 
         # Get all user data
-        quiz_results = await supabase_service.get_user_quiz_results(user_id)
-        midterm_analyses = await supabase_service.get_user_midterm_analyses(user_id)
+        # Stats cover the user's whole history, not just the first page
+        quiz_results = await supabase_service.get_user_quiz_results(user_id, limit=None)
+        midterm_analyses = await supabase_service.get_user_midterm_analyses(
+            user_id, limit=None
+        )
         weaknesses = await rag_service.get_user_weaknesses(user_id)
 
         # Aggregate all weaknesses and mistakes
@@ -2372,7 +2450,7 @@ async def generate_rag_quiz(user_id: str, num_questions: int = 10):
             # Generate temporary ID
             quiz_id = f"rag_quiz_{user_id}_{int(datetime.now().timestamp())}"
 
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "quiz_id": quiz_id,
                 "title": rag_quiz_title,
@@ -2391,27 +2469,264 @@ async def generate_rag_quiz(user_id: str, num_questions: int = 10):
         )
 
 
+# Page geometry shared by all PDF reports
+LETTER_W, LETTER_H = letter
+MAX_TEXT_W = LETTER_W - 100
+
+# Small pool of PDF output buffers reused across report requests. Canvas
+# objects hold per-document state, so only the BytesIO is recycled.
+_pdf_buffer_pool: "queue.Queue[io.BytesIO]" = queue.Queue(maxsize=4)
+
+
+def _acquire_pdf_buffer() -> io.BytesIO:
+    """Take an empty buffer from the pool, or allocate one if the pool is empty"""
+    try:
+        return _pdf_buffer_pool.get_nowait()
+    except queue.Empty:
+        return io.BytesIO()
+
+
+def _release_pdf_buffer(buffer: io.BytesIO):
+    """Reset a buffer and return it to the pool (dropped if the pool is full)"""
+    buffer.seek(0)
+    buffer.truncate(0)
+    try:
+        _pdf_buffer_pool.put_nowait(buffer)
+    except queue.Full:
+        pass
+
+
+def _set_font(c, name: str, size: float):
+    """Switch the canvas font only if it differs from the active one.
+
+    Reads the canvas' own font state, which reportlab resets on showPage(),
+    so a page break never leaves a stale font cached here.
+    """
+    if c._fontname != name or c._fontsize != size:
+        c.setFont(name, size)
+
+
+def _wrap_text(c, text: str, font: str, size: float, max_width: float) -> List[str]:
+    """Greedy word wrap of text into lines no wider than max_width"""
+    lines = []
+    line = ""
+    for word in text.split():
+        if c.stringWidth(line + word, font, size) < max_width:
+            line += word + " "
+        else:
+            if line:
+                lines.append(line.strip())
+            line = word + " "
+    if line:
+        lines.append(line.strip())
+    return lines
+
+
+class _TextCursor:
+    """Write position on a PDF canvas that starts a new page on overflow"""
+
+    __slots__ = ("c", "height", "y")
+
+    def __init__(self, c, height: float = LETTER_H):
+        self.c = c
+        self.height = height
+        self.y = height - 50
+
+    def draw(self, x: float, text: str, font: str, size: float):
+        """Draw one line at the current position (font is re-applied after page breaks)"""
+        _set_font(self.c, font, size)
+        self.c.drawString(x, self.y, text)
+
+    def advance(self, dy: float = 15):
+        """Move down by dy, breaking to a new page below the bottom margin"""
+        self.y -= dy
+        if self.y < 100:
+            self.new_page()
+
+    def ensure_space(self, min_y: float = 150):
+        """Start a new page if fewer than min_y points remain"""
+        if self.y < min_y:
+            self.new_page()
+
+    def new_page(self):
+        self.c.showPage()
+        self.y = self.height - 50
+
+    def paragraph(
+        self,
+        x: float,
+        text: str,
+        font: str,
+        size: float,
+        max_width: float,
+        line_dy: float = 15,
+        end_dy: float = 18,
+    ):
+        """Draw word-wrapped text; end_dy is the gap after the last line"""
+        lines = _wrap_text(self.c, text, font, size, max_width)
+        for i, line in enumerate(lines, 1):
+            self.draw(x, line, font, size)
+            self.advance(end_dy if i == len(lines) else line_dy)
+
+
+# Prompt for the comprehensive study report; filled with str.format_map at
+# request time. Doubled braces are literal placeholders meant for the model.
+_ANALYSIS_PROMPT_TEMPLATE = """
+Analyze this student's complete learning journey using the detailed data below. Provide specific, actionable insights based on the actual patterns found in their performance data.
+
+=== PERFORMANCE SUMMARY ===
+- Total Quizzes Completed: {num_quizzes}
+- Total Midterm Reviews: {num_midterms}
+- Overall Average Score: {overall_accuracy:.1f}%
+- Total Questions Attempted: {total_questions}
+- Total Correct Answers: {total_correct}
+- Accuracy Rate: {accuracy_rate:.1f}%
+
+=== DETAILED QUIZ HISTORY ===
+{quiz_history}
+
+=== DETAILED MIDTERM HISTORY ===
+{midterm_history}
+
+=== IDENTIFIED WEAK TOPICS ===
+{weak_topics}
+
+=== DISCOVERED PATTERNS ===
+{patterns}
+
+=== HIDDEN INSIGHTS ===
+{hidden_insights}
+
+=== ANALYSIS REQUIREMENTS ===
+Based on this REAL data, provide a COMPREHENSIVE, DETAILED analysis with extensive reasoning:
+
+1. OVERVIEW (5-8 sentences, 150-250 words):
+   - Start with a comprehensive assessment of their learning journey
+   - Mention specific numbers: "{num_quizzes} quizzes", "{num_midterms} midterm reviews", "{overall_accuracy:.1f}% average score", "{total_questions} questions attempted", "{total_correct} correct answers"
+   - Analyze their overall progress trajectory (improving, declining, or stable)
+   - Reference specific patterns discovered (e.g., "Your recent performance shows a {trend_delta:.1f}% decline, indicating...")
+   - Provide reasoning for what these numbers mean
+   - Discuss the significance of their learning activity level
+   - End with an overall assessment of their learning status
+
+2. STRENGTHS (5-8 items, each 2-3 sentences with reasoning):
+   - Identify actual strengths from the data with specific evidence
+   - If they improved over time, explain WHY this happened and what it means
+   - If certain topics score well, list them with specific scores and explain why they're strengths
+   - Reference specific quiz numbers or dates if available
+   - Explain the significance of each strength
+   - Be specific: "In Quiz 3 on [date], you scored 85% on [topic], demonstrating strong understanding of..."
+   - Discuss what these strengths indicate about their learning style
+
+3. WEAKNESSES (8-12 items, each 2-3 sentences with detailed analysis):
+   - List actual weak topics with specific performance data
+   - For each weakness, provide:
+     * The topic name
+     * How many times it appeared as weak (e.g., "appeared in 4 out of 6 quizzes")
+     * Average score on that topic
+     * Specific examples from quiz/midterm history
+     * Reasoning for why this is a weakness
+     * Impact on overall performance
+   - Reference consistently weak topics with full context
+   - Explain the pattern: "This topic appears as a weakness in {{X}}% of your assessments, suggesting..."
+   - Discuss the root cause if identifiable from patterns
+
+4. RECOMMENDATIONS (10-15 detailed items, each 3-5 sentences with extensive reasoning):
+   Each recommendation must include:
+   - WHAT to do (specific action)
+   - WHY to do it (reasoning based on their data/patterns)
+   - HOW to do it (step-by-step approach)
+   - WHEN to do it (timeline or priority)
+   - EXPECTED OUTCOME (what improvement to expect)
+
+   Structure recommendations around:
+   - Hidden patterns discovered (explain the pattern, why it matters, how to address it)
+   - Specific weak topics (name the topic, explain why it's weak, provide targeted study plan)
+   - Time-performance correlations (if found, explain the relationship and suggest pacing strategies)
+   - Consistency issues (if found, explain the variance and suggest stabilization methods)
+   - Topic clusters (if found, explain the domain gap and suggest foundational review)
+   - Performance trends (if declining, explain why and suggest recovery strategies)
+
+   Example format: "Focus intensively on {{topic}} because it appears as a weakness in {{X}} of your {{Y}} assessments with an average score of {{Z}}%. This indicates a fundamental gap that's affecting your overall performance. Start by reviewing basic concepts through [specific resource type], then practice with [specific practice type] for 2-3 hours daily. Track your progress weekly. You should see improvement within 2-3 weeks, which should raise your overall average by approximately {{estimated_improvement}}%."
+
+5. STUDY_STRATEGY (8-12 sentences, 200-300 words):
+   A comprehensive, personalized strategy that:
+   - Opens with an assessment of their current learning approach based on data
+   - References their actual performance patterns with specific numbers
+   - Explains WHY a particular approach will work for them (based on patterns)
+   - Suggests a specific, phased approach:
+     * Phase 1: Immediate actions (next week)
+     * Phase 2: Short-term goals (next month)
+     * Phase 3: Long-term improvement (next 2-3 months)
+   - Mentions their weak topic clusters with reasoning
+   - Addresses time management based on time-performance patterns
+   - Provides a concrete, week-by-week action plan
+   - Explains the expected trajectory of improvement
+   - Discusses how to measure progress
+   - Ends with motivation based on their specific achievements
+
+=== WRITING STYLE ===
+- Use comprehensive, detailed explanations
+- Provide reasoning for every claim
+- Reference specific data points throughout
+- Use professional but accessible language
+- Be encouraging but realistic
+- Show deep analysis, not surface-level observations
+- Connect different data points to reveal insights
+- Explain the "why" behind every recommendation
+
+IMPORTANT:
+- Make everything specific to THIS student's data
+- Reference actual numbers, topics, dates, and patterns throughout
+- Do NOT use generic advice - every sentence should be personalized
+- Provide extensive reasoning and explanations
+- Show deep analytical thinking
+- Make the report comprehensive and detailed (aim for 1000+ words total)
+
+Return JSON with: {{"overview": "...", "strengths": ["..."], "weaknesses": ["..."], "recommendations": ["..."], "study_strategy": "..."}}
+"""
+
+
+def _coerce_str(value: Any, default: str) -> str:
+    """Return value as report text: strings pass through, dicts are stringified"""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return str(value) or default
+    return default
+
+
+def _coerce_list(value: Any, default: List[Any]) -> List[Any]:
+    """Return value if it is a list, otherwise the default"""
+    return value if isinstance(value, list) else default
+
+
 @app.get("/api/user/{user_id}/comprehensive-study-report")
-async def generate_comprehensive_study_report(user_id: str):
+async def generate_comprehensive_study_report(
+    user_id: str, accept: Optional[str] = Header(None)
+):
     """
     Generate a comprehensive PDF report of the user's entire study analysis
     Uses Nemotron model to analyze all learning data and create detailed insights
+
+    If the AI analysis is unavailable and the client accepts JSON, a compact
+    JSON summary is returned (206) instead of rendering a near-empty PDF.
     """
     try:
-        from reportlab.lib.pagesizes import letter
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.units import inch
-        import io
-
         logger.info(f"Generating comprehensive study report for user: {user_id}")
 
-        # Get all user data
-        quiz_results = await supabase_service.get_user_quiz_results(user_id)
-        midterm_analyses = await supabase_service.get_user_midterm_analyses(user_id)
-        weaknesses = await rag_service.get_user_weaknesses(user_id)
+        # Get all user data (independent reads, fetched concurrently)
+        quiz_results, midterm_analyses, weaknesses = await asyncio.gather(
+            supabase_service.get_user_quiz_results(user_id, limit=None),
+            supabase_service.get_user_midterm_analyses(user_id, limit=None),
+            rag_service.get_user_weaknesses(user_id),
+        )
 
         # Get RAG progress analysis
         progress_data = None
+        top_weak = []
+        # Set only when the AI analysis fails and the placeholder payload is used
+        degraded = False
         try:
             # Reuse the RAG progress logic
             all_scores = []
@@ -2436,6 +2751,10 @@ async def generate_comprehensive_study_report(user_id: str):
 
             overall_accuracy = sum(all_scores) / len(all_scores) if all_scores else 0
 
+            # De-duplicate weak topics once, keeping first-seen order
+            unique_weak_topics = list(dict.fromkeys(all_weak_topics))
+            top_weak = unique_weak_topics[:10]
+
             # Initialize pattern tracking variables
             patterns_analysis = []
             hidden_patterns = []
@@ -2445,6 +2764,7 @@ async def generate_comprehensive_study_report(user_id: str):
             hidden_patterns = []
 
             # Pattern 1: Performance trends over time
+            trend_delta = 0.0
             if len(quiz_results) >= 3:
                 recent_scores = [r.get("score", 0) for r in quiz_results[:3]]
                 older_scores = (
@@ -2455,6 +2775,7 @@ async def generate_comprehensive_study_report(user_id: str):
                 if older_scores:
                     recent_avg = sum(recent_scores) / len(recent_scores)
                     older_avg = sum(older_scores) / len(older_scores)
+                    trend_delta = recent_avg - older_avg
                     if recent_avg > older_avg + 5:
                         patterns_analysis.append(
                             f"IMPROVING TREND: Recent quiz scores ({recent_avg:.1f}%) are significantly higher than earlier scores ({older_avg:.1f}%), showing {recent_avg - older_avg:.1f}% improvement."
@@ -2655,120 +2976,46 @@ async def generate_comprehensive_study_report(user_id: str):
                 )
 
             # Build comprehensive AI analysis prompt with actual data
-            analysis_prompt = f"""
-            Analyze this student's complete learning journey using the detailed data below. Provide specific, actionable insights based on the actual patterns found in their performance data.
-            
-            === PERFORMANCE SUMMARY ===
-            - Total Quizzes Completed: {len(quiz_results)}
-            - Total Midterm Reviews: {len(midterm_analyses)}
-            - Overall Average Score: {overall_accuracy:.1f}%
-            - Total Questions Attempted: {total_questions}
-            - Total Correct Answers: {total_correct}
-            - Accuracy Rate: {(total_correct/total_questions*100) if total_questions > 0 else 0:.1f}%
-            
-            === DETAILED QUIZ HISTORY ===
-            {chr(10).join(quiz_details) if quiz_details else 'No quiz data available'}
-            
-            === DETAILED MIDTERM HISTORY ===
-            {chr(10).join(midterm_details) if midterm_details else 'No midterm data available'}
-            
-            === IDENTIFIED WEAK TOPICS ===
-            {', '.join(list(set(all_weak_topics))[:15]) if all_weak_topics else 'None identified'}
-            
-            === DISCOVERED PATTERNS ===
-            {chr(10).join(patterns_analysis) if patterns_analysis else 'No significant patterns detected yet'}
-            
-            === HIDDEN INSIGHTS ===
-            {chr(10).join(hidden_patterns) if hidden_patterns else 'Continue learning to discover patterns'}
-            
-            === ANALYSIS REQUIREMENTS ===
-            Based on this REAL data, provide a COMPREHENSIVE, DETAILED analysis with extensive reasoning:
-            
-            1. OVERVIEW (5-8 sentences, 150-250 words): 
-               - Start with a comprehensive assessment of their learning journey
-               - Mention specific numbers: "{len(quiz_results)} quizzes", "{len(midterm_analyses)} midterm reviews", "{overall_accuracy:.1f}% average score", "{total_questions} questions attempted", "{total_correct} correct answers"
-               - Analyze their overall progress trajectory (improving, declining, or stable)
-               - Reference specific patterns discovered (e.g., "Your recent performance shows a {recent_avg - older_avg:.1f}% decline, indicating...")
-               - Provide reasoning for what these numbers mean
-               - Discuss the significance of their learning activity level
-               - End with an overall assessment of their learning status
-            
-            2. STRENGTHS (5-8 items, each 2-3 sentences with reasoning):
-               - Identify actual strengths from the data with specific evidence
-               - If they improved over time, explain WHY this happened and what it means
-               - If certain topics score well, list them with specific scores and explain why they're strengths
-               - Reference specific quiz numbers or dates if available
-               - Explain the significance of each strength
-               - Be specific: "In Quiz 3 on [date], you scored 85% on [topic], demonstrating strong understanding of..."
-               - Discuss what these strengths indicate about their learning style
-            
-            3. WEAKNESSES (8-12 items, each 2-3 sentences with detailed analysis):
-               - List actual weak topics with specific performance data
-               - For each weakness, provide:
-                 * The topic name
-                 * How many times it appeared as weak (e.g., "appeared in 4 out of 6 quizzes")
-                 * Average score on that topic
-                 * Specific examples from quiz/midterm history
-                 * Reasoning for why this is a weakness
-                 * Impact on overall performance
-               - Reference consistently weak topics with full context
-               - Explain the pattern: "This topic appears as a weakness in {X}% of your assessments, suggesting..."
-               - Discuss the root cause if identifiable from patterns
-            
-            4. RECOMMENDATIONS (10-15 detailed items, each 3-5 sentences with extensive reasoning):
-               Each recommendation must include:
-               - WHAT to do (specific action)
-               - WHY to do it (reasoning based on their data/patterns)
-               - HOW to do it (step-by-step approach)
-               - WHEN to do it (timeline or priority)
-               - EXPECTED OUTCOME (what improvement to expect)
-               
-               Structure recommendations around:
-               - Hidden patterns discovered (explain the pattern, why it matters, how to address it)
-               - Specific weak topics (name the topic, explain why it's weak, provide targeted study plan)
-               - Time-performance correlations (if found, explain the relationship and suggest pacing strategies)
-               - Consistency issues (if found, explain the variance and suggest stabilization methods)
-               - Topic clusters (if found, explain the domain gap and suggest foundational review)
-               - Performance trends (if declining, explain why and suggest recovery strategies)
-               
-               Example format: "Focus intensively on {topic} because it appears as a weakness in {X} of your {Y} assessments with an average score of {Z}%. This indicates a fundamental gap that's affecting your overall performance. Start by reviewing basic concepts through [specific resource type], then practice with [specific practice type] for 2-3 hours daily. Track your progress weekly. You should see improvement within 2-3 weeks, which should raise your overall average by approximately {estimated_improvement}%."
-            
-            5. STUDY_STRATEGY (8-12 sentences, 200-300 words): 
-               A comprehensive, personalized strategy that:
-               - Opens with an assessment of their current learning approach based on data
-               - References their actual performance patterns with specific numbers
-               - Explains WHY a particular approach will work for them (based on patterns)
-               - Suggests a specific, phased approach:
-                 * Phase 1: Immediate actions (next week)
-                 * Phase 2: Short-term goals (next month)
-                 * Phase 3: Long-term improvement (next 2-3 months)
-               - Mentions their weak topic clusters with reasoning
-               - Addresses time management based on time-performance patterns
-               - Provides a concrete, week-by-week action plan
-               - Explains the expected trajectory of improvement
-               - Discusses how to measure progress
-               - Ends with motivation based on their specific achievements
-            
-            === WRITING STYLE ===
-            - Use comprehensive, detailed explanations
-            - Provide reasoning for every claim
-            - Reference specific data points throughout
-            - Use professional but accessible language
-            - Be encouraging but realistic
-            - Show deep analysis, not surface-level observations
-            - Connect different data points to reveal insights
-            - Explain the "why" behind every recommendation
-            
-            IMPORTANT: 
-            - Make everything specific to THIS student's data
-            - Reference actual numbers, topics, dates, and patterns throughout
-            - Do NOT use generic advice - every sentence should be personalized
-            - Provide extensive reasoning and explanations
-            - Show deep analytical thinking
-            - Make the report comprehensive and detailed (aim for 1000+ words total)
-            
-            Return JSON with: {{"overview": "...", "strengths": ["..."], "weaknesses": ["..."], "recommendations": ["..."], "study_strategy": "..."}}
-            """
+            analysis_prompt = _ANALYSIS_PROMPT_TEMPLATE.format_map(
+                {
+                    "num_quizzes": len(quiz_results),
+                    "num_midterms": len(midterm_analyses),
+                    "overall_accuracy": overall_accuracy,
+                    "total_questions": total_questions,
+                    "total_correct": total_correct,
+                    "accuracy_rate": (
+                        (total_correct / total_questions * 100)
+                        if total_questions > 0
+                        else 0
+                    ),
+                    "quiz_history": (
+                        "\n".join(quiz_details)
+                        if quiz_details
+                        else "No quiz data available"
+                    ),
+                    "midterm_history": (
+                        "\n".join(midterm_details)
+                        if midterm_details
+                        else "No midterm data available"
+                    ),
+                    "weak_topics": (
+                        ", ".join(unique_weak_topics[:15])
+                        if all_weak_topics
+                        else "None identified"
+                    ),
+                    "patterns": (
+                        "\n".join(patterns_analysis)
+                        if patterns_analysis
+                        else "No significant patterns detected yet"
+                    ),
+                    "hidden_insights": (
+                        "\n".join(hidden_patterns)
+                        if hidden_patterns
+                        else "Continue learning to discover patterns"
+                    ),
+                    "trend_delta": trend_delta,
+                }
+            )
 
             ai_response = await ai_service.generate_response(
                 analysis_prompt, temperature=0.8, max_tokens=4000
@@ -2782,65 +3029,34 @@ async def generate_comprehensive_study_report(user_id: str):
 
             # Parse AI response
             try:
-                json_match = re.search(r"\{.*\}", ai_response, re.DOTALL)
+                json_match = _JSON_RE.search(ai_response)
                 if json_match:
-                    parsed_data = json.loads(json_match.group(0))
+                    parsed_data = orjson.loads(json_match.group(0))
                     # Ensure all fields are in correct format
                     progress_data = {
-                        "overview": (
-                            str(
-                                parsed_data.get(
-                                    "overview",
-                                    "Comprehensive learning analysis completed",
-                                )
-                            )
-                            if isinstance(parsed_data.get("overview"), (str, dict))
-                            else "Comprehensive learning analysis completed"
+                        "overview": _coerce_str(
+                            parsed_data.get("overview"),
+                            "Comprehensive learning analysis completed",
                         ),
-                        "strengths": (
-                            parsed_data.get("strengths", [])
-                            if isinstance(parsed_data.get("strengths"), list)
-                            else []
+                        "strengths": _coerce_list(parsed_data.get("strengths"), []),
+                        "weaknesses": _coerce_list(
+                            parsed_data.get("weaknesses"),
+                            top_weak,
                         ),
-                        "weaknesses": (
-                            parsed_data.get(
-                                "weaknesses", list(set(all_weak_topics))[:10]
-                            )
-                            if isinstance(parsed_data.get("weaknesses"), list)
-                            else list(set(all_weak_topics))[:10]
+                        "recommendations": _coerce_list(
+                            parsed_data.get("recommendations"),
+                            ["Continue practicing identified weak areas"],
                         ),
-                        "recommendations": (
-                            parsed_data.get(
-                                "recommendations",
-                                ["Continue practicing identified weak areas"],
-                            )
-                            if isinstance(parsed_data.get("recommendations"), list)
-                            else ["Continue practicing identified weak areas"]
-                        ),
-                        "study_strategy": (
-                            str(
-                                parsed_data.get(
-                                    "study_strategy",
-                                    "Focus on weak topics systematically",
-                                )
-                            )
-                            if isinstance(
-                                parsed_data.get("study_strategy"), (str, dict)
-                            )
-                            else "Focus on weak topics systematically"
+                        "study_strategy": _coerce_str(
+                            parsed_data.get("study_strategy"),
+                            "Focus on weak topics systematically",
                         ),
                     }
-                    # If overview is a dict, try to extract text from it
-                    if isinstance(progress_data["overview"], dict):
-                        progress_data["overview"] = (
-                            str(progress_data["overview"])
-                            or "Comprehensive learning analysis completed"
-                        )
                 else:
                     progress_data = {
                         "overview": "Comprehensive learning analysis completed",
                         "strengths": [],
-                        "weaknesses": list(set(all_weak_topics))[:10],
+                        "weaknesses": top_weak,
                         "recommendations": [
                             "Continue practicing identified weak areas"
                         ],
@@ -2851,12 +3067,13 @@ async def generate_comprehensive_study_report(user_id: str):
                 progress_data = {
                     "overview": "Learning analysis completed",
                     "strengths": [],
-                    "weaknesses": list(set(all_weak_topics))[:10],
+                    "weaknesses": top_weak,
                     "recommendations": ["Practice weak topics"],
                     "study_strategy": "Systematic review of weak areas",
                 }
         except Exception as e:
             logger.warning(f"Failed to get AI analysis for report: {str(e)}")
+            degraded = True
             progress_data = {
                 "overview": "Learning analysis",
                 "strengths": [],
@@ -2865,30 +3082,40 @@ async def generate_comprehensive_study_report(user_id: str):
                 "study_strategy": "",
             }
 
+        # AI analysis failed entirely - avoid rendering a mostly empty PDF
+        if degraded and accept and "application/json" in accept:
+            return ORJSONResponse(
+                status_code=206,
+                content={
+                    "overview": progress_data.get("overview", ""),
+                    "total_quizzes": len(quiz_results),
+                    "total_midterms": len(midterm_analyses),
+                    "weak_topics": list(dict.fromkeys(weaknesses.get("topics", []))),
+                    "error": "AI analysis unavailable",
+                },
+            )
+
         # Create PDF
-        buffer = io.BytesIO()
+        buffer = _acquire_pdf_buffer()
         c = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
-
-        y = height - 50
+        cur = _TextCursor(c)
 
         # Title
-        c.setFont("Helvetica-Bold", 24)
-        c.drawString(50, y, "Comprehensive Study Analysis Report")
-        y -= 40
+        cur.draw(50, "Comprehensive Study Analysis Report", "Helvetica-Bold", 24)
+        cur.advance(40)
 
         # Generated date
-        c.setFont("Helvetica", 12)
-        c.drawString(
-            50, y, f"Generated: {datetime.now().strftime('%B %d, %Y %I:%M %p')}"
+        cur.draw(
+            50,
+            f"Generated: {datetime.now().strftime('%B %d, %Y %I:%M %p')}",
+            "Helvetica",
+            12,
         )
-        y -= 30
+        cur.advance(30)
 
         # Overview Section
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(50, y, "Executive Summary")
-        y -= 25
-        c.setFont("Helvetica", 11)
+        cur.draw(50, "Executive Summary", "Helvetica-Bold", 16)
+        cur.advance(25)
         overview_text = progress_data.get(
             "overview",
             "Comprehensive learning analysis based on all quiz and midterm review data.",
@@ -2900,192 +3127,88 @@ async def generate_comprehensive_study_report(user_id: str):
                 if overview_text
                 else "Comprehensive learning analysis based on all quiz and midterm review data."
             )
-        # Wrap text
-        lines = []
-        words = overview_text.split()
-        line = ""
-        for word in words:
-            if c.stringWidth(line + word, "Helvetica", 11) < width - 100:
-                line += word + " "
-            else:
-                if line:
-                    lines.append(line.strip())
-                line = word + " "
-        if line:
-            lines.append(line.strip())
-
+        lines = _wrap_text(c, overview_text, "Helvetica", 11, MAX_TEXT_W)
         for line in lines[:5]:  # Limit to 5 lines
-            c.drawString(70, y, line)
-            y -= 15
-            if y < 100:
-                c.showPage()
-                y = height - 50
+            cur.draw(70, line, "Helvetica", 11)
+            cur.advance(15)
 
-        y -= 20
+        cur.advance(20)
 
         # Performance Metrics
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(50, y, "Performance Metrics")
-        y -= 25
-        c.setFont("Helvetica", 11)
-        c.drawString(70, y, f"Total Quizzes Completed: {len(quiz_results)}")
-        y -= 15
-        c.drawString(70, y, f"Total Midterm Reviews: {len(midterm_analyses)}")
-        y -= 15
-        c.drawString(70, y, f"Overall Average Score: {overall_accuracy:.1f}%")
-        y -= 15
-        c.drawString(70, y, f"Total Questions Attempted: {total_questions}")
-        y -= 15
-        c.drawString(70, y, f"Total Correct Answers: {total_correct}")
-        y -= 30
-
-        if y < 150:
-            c.showPage()
-            y = height - 50
+        cur.draw(50, "Performance Metrics", "Helvetica-Bold", 16)
+        cur.advance(25)
+        for metric in (
+            f"Total Quizzes Completed: {len(quiz_results)}",
+            f"Total Midterm Reviews: {len(midterm_analyses)}",
+            f"Overall Average Score: {overall_accuracy:.1f}%",
+            f"Total Questions Attempted: {total_questions}",
+            f"Total Correct Answers: {total_correct}",
+        ):
+            cur.draw(70, metric, "Helvetica", 11)
+            cur.advance(15)
+        cur.advance(15)
+
+        cur.ensure_space()
 
         # Hidden Patterns Section (if available)
         if patterns_analysis or hidden_patterns:
-            c.setFont("Helvetica-Bold", 16)
-            c.drawString(50, y, "Discovered Patterns & Hidden Insights")
-            y -= 25
-            c.setFont("Helvetica", 11)
+            cur.draw(50, "Discovered Patterns & Hidden Insights", "Helvetica-Bold", 16)
+            cur.advance(25)
 
             if patterns_analysis:
-                c.setFont("Helvetica-Bold", 12)
-                c.drawString(70, y, "Performance Patterns:")
-                y -= 18
-                c.setFont("Helvetica", 10)
+                cur.draw(70, "Performance Patterns:", "Helvetica-Bold", 12)
+                cur.advance(18)
                 for pattern in patterns_analysis[:5]:  # Limit to 5 patterns
-                    # Wrap long patterns
-                    words = pattern.split()
-                    line = ""
-                    for word in words:
-                        if c.stringWidth(line + word, "Helvetica", 10) < width - 100:
-                            line += word + " "
-                        else:
-                            if line:
-                                c.drawString(80, y, line.strip())
-                                y -= 14
-                                if y < 100:
-                                    c.showPage()
-                                    y = height - 50
-                            line = word + " "
-                    if line:
-                        c.drawString(80, y, line.strip())
-                        y -= 18
-                    if y < 100:
-                        c.showPage()
-                        y = height - 50
+                    cur.paragraph(
+                        80, pattern, "Helvetica", 10, MAX_TEXT_W, line_dy=14
+                    )
 
             if hidden_patterns:
-                y -= 10
-                if y < 150:
-                    c.showPage()
-                    y = height - 50
-                c.setFont("Helvetica-Bold", 12)
-                c.drawString(70, y, "Hidden Insights:")
-                y -= 18
-                c.setFont("Helvetica", 10)
+                cur.advance(10)
+                cur.ensure_space()
+                cur.draw(70, "Hidden Insights:", "Helvetica-Bold", 12)
+                cur.advance(18)
                 for insight in hidden_patterns[:4]:  # Limit to 4 insights
-                    words = insight.split()
-                    line = ""
-                    for word in words:
-                        if c.stringWidth(line + word, "Helvetica", 10) < width - 100:
-                            line += word + " "
-                        else:
-                            if line:
-                                c.drawString(80, y, line.strip())
-                                y -= 14
-                                if y < 100:
-                                    c.showPage()
-                                    y = height - 50
-                            line = word + " "
-                    if line:
-                        c.drawString(80, y, line.strip())
-                        y -= 18
-                    if y < 100:
-                        c.showPage()
-                        y = height - 50
-            y -= 10
-
-        if y < 150:
-            c.showPage()
-            y = height - 50
+                    cur.paragraph(
+                        80, insight, "Helvetica", 10, MAX_TEXT_W, line_dy=14
+                    )
+            cur.advance(10)
+
+        cur.ensure_space()
 
         # Strengths
         strengths = progress_data.get("strengths", [])
         if strengths:
-            c.setFont("Helvetica-Bold", 16)
-            c.drawString(50, y, "Strengths")
-            y -= 25
-            c.setFont("Helvetica", 11)
+            cur.draw(50, "Strengths", "Helvetica-Bold", 16)
+            cur.advance(25)
             for strength in strengths[:10]:
-                c.drawString(70, y, f"• {strength}")
-                y -= 15
-                if y < 100:
-                    c.showPage()
-                    y = height - 50
-            y -= 10
+                cur.draw(70, f"• {strength}", "Helvetica", 11)
+                cur.advance(15)
+            cur.advance(10)
 
         # Weaknesses
-        weaknesses_list = progress_data.get(
-            "weaknesses", list(set(all_weak_topics))[:10]
-        )
+        weaknesses_list = progress_data.get("weaknesses", top_weak)
         if weaknesses_list:
-            if y < 150:
-                c.showPage()
-                y = height - 50
-            c.setFont("Helvetica-Bold", 16)
-            c.drawString(50, y, "Areas for Improvement")
-            y -= 25
-            c.setFont("Helvetica", 11)
+            cur.ensure_space()
+            cur.draw(50, "Areas for Improvement", "Helvetica-Bold", 16)
+            cur.advance(25)
             for weakness in weaknesses_list[:15]:
-                c.drawString(70, y, f"• {weakness}")
-                y -= 15
-                if y < 100:
-                    c.showPage()
-                    y = height - 50
-            y -= 10
+                cur.draw(70, f"• {weakness}", "Helvetica", 11)
+                cur.advance(15)
+            cur.advance(10)
 
         # Recommendations
         recommendations = progress_data.get("recommendations", [])
         if recommendations:
-            if y < 150:
-                c.showPage()
-                y = height - 50
-            c.setFont("Helvetica-Bold", 16)
-            c.drawString(50, y, "AI-Generated Recommendations")
-            y -= 25
-            c.setFont("Helvetica", 11)
-            rec_num = 1
-            for rec in recommendations[:15]:  # Show up to 15 recommendations
-                # Number the recommendation
-                c.setFont("Helvetica-Bold", 11)
-                c.drawString(70, y, f"Recommendation {rec_num}:")
-                y -= 18
-                c.setFont("Helvetica", 10)
-
+            cur.ensure_space()
+            cur.draw(50, "AI-Generated Recommendations", "Helvetica-Bold", 16)
+            cur.advance(25)
+            # Show up to 15 recommendations
+            for rec_num, rec in enumerate(recommendations[:15], 1):
+                cur.draw(70, f"Recommendation {rec_num}:", "Helvetica-Bold", 11)
+                cur.advance(18)
                 # Wrap long recommendations (each can be multiple paragraphs)
-                words = rec.split()
-                line = ""
-                for word in words:
-                    if c.stringWidth(line + word, "Helvetica", 10) < width - 100:
-                        line += word + " "
-                    else:
-                        if line:
-                            c.drawString(80, y, line.strip())
-                            y -= 13
-                            if y < 100:
-                                c.showPage()
-                                y = height - 50
-                        line = word + " "
-                if line:
-                    c.drawString(80, y, line.strip())
-                    y -= 18
-                if y < 100:
-                    c.showPage()
-                    y = height - 50
-                rec_num += 1
+                cur.paragraph(80, rec, "Helvetica", 10, MAX_TEXT_W, line_dy=13)
 
         # Study Strategy
         study_strategy = progress_data.get("study_strategy", "")
@@ -3093,13 +3216,9 @@ async def generate_comprehensive_study_report(user_id: str):
         if not isinstance(study_strategy, str):
             study_strategy = str(study_strategy) if study_strategy else ""
         if study_strategy:
-            if y < 150:
-                c.showPage()
-                y = height - 50
-            c.setFont("Helvetica-Bold", 16)
-            c.drawString(50, y, "Comprehensive Study Strategy")
-            y -= 25
-            c.setFont("Helvetica", 11)
+            cur.ensure_space()
+            cur.draw(50, "Comprehensive Study Strategy", "Helvetica-Bold", 16)
+            cur.advance(25)
             # Split strategy into paragraphs if it contains newlines
             strategy_paragraphs = (
                 study_strategy.split("\n\n")
@@ -3108,31 +3227,17 @@ async def generate_comprehensive_study_report(user_id: str):
             )
 
             for paragraph in strategy_paragraphs:
-                words = paragraph.split()
-                line = ""
-                for word in words:
-                    if c.stringWidth(line + word, "Helvetica", 11) < width - 100:
-                        line += word + " "
-                    else:
-                        if line:
-                            c.drawString(70, y, line.strip())
-                            y -= 15
-                            if y < 100:
-                                c.showPage()
-                                y = height - 50
-                        line = word + " "
-                if line:
-                    c.drawString(70, y, line.strip())
-                    y -= 20  # Extra space between paragraphs
-                if y < 100:
-                    c.showPage()
-                    y = height - 50
+                # Extra space between paragraphs
+                cur.paragraph(
+                    70, paragraph, "Helvetica", 11, MAX_TEXT_W, end_dy=20
+                )
 
         c.save()
-        buffer.seek(0)
+        pdf_bytes = buffer.getvalue()
+        _release_pdf_buffer(buffer)
 
         return Response(
-            content=buffer.read(),
+            content=pdf_bytes,
             media_type="application/pdf",
             headers={
                 "Content-Disposition": f'attachment; filename="comprehensive_study_report_{user_id}_{datetime.now().strftime("%Y%m%d")}.pdf"'
@@ -3154,11 +3259,6 @@ async def generate_rag_quiz_report(user_id: str, quiz_result_id: str):
     Generate a downloadable PDF report for RAG quiz results
     """
     try:
-        from reportlab.lib.pagesizes import letter
-        from reportlab.pdfgen import canvas
-        from reportlab.lib.units import inch
-        import io
-
         # Get quiz result data
         result = await supabase_service.get_quiz_result_by_id(quiz_result_id, user_id)
         quiz = None
@@ -3170,74 +3270,67 @@ async def generate_rag_quiz_report(user_id: str, quiz_result_id: str):
                 pass
 
         # Create PDF
-        buffer = io.BytesIO()
+        buffer = _acquire_pdf_buffer()
         c = canvas.Canvas(buffer, pagesize=letter)
-        width, height = letter
+        cur = _TextCursor(c)
 
         # Title
-        c.setFont("Helvetica-Bold", 20)
-        c.drawString(50, height - 50, "RAG-Based Assessment Report")
+        cur.draw(50, "RAG-Based Assessment Report", "Helvetica-Bold", 20)
+        cur.advance(30)
 
         # User info
-        c.setFont("Helvetica", 12)
-        c.drawString(
+        cur.draw(
             50,
-            height - 80,
             f"Generated: {datetime.now().strftime('%B %d, %Y %I:%M %p')}",
+            "Helvetica",
+            12,
         )
+        cur.advance(30)
 
         # Score
         score = result.get("score", 0)
-        c.setFont("Helvetica-Bold", 16)
-        c.drawString(50, height - 110, f"Overall Score: {score:.1f}%")
+        cur.draw(50, f"Overall Score: {score:.1f}%", "Helvetica-Bold", 16)
+        cur.advance(40)
 
         # Performance metrics
-        y = height - 150
-        c.setFont("Helvetica", 12)
-        c.drawString(
+        cur.draw(
             50,
-            y,
             f"Correct Answers: {result.get('correct_count', 0)}/{result.get('total_questions', 0)}",
+            "Helvetica",
+            12,
+        )
+        cur.advance(20)
+        cur.draw(
+            50, f"Time Spent: {result.get('time_spent', 0)} seconds", "Helvetica", 12
         )
-        y -= 20
-        c.drawString(50, y, f"Time Spent: {result.get('time_spent', 0)} seconds")
 
         # Weak areas
-        y -= 40
+        cur.advance(40)
         weak_topics = result.get("weak_topics", [])
         if weak_topics:
-            c.setFont("Helvetica-Bold", 14)
-            c.drawString(50, y, "Areas Needing Improvement:")
-            y -= 20
-            c.setFont("Helvetica", 11)
+            cur.draw(50, "Areas Needing Improvement:", "Helvetica-Bold", 14)
+            cur.advance(20)
             for topic in weak_topics[:10]:
-                c.drawString(70, y, f"• {topic}")
-                y -= 15
-                if y < 100:
-                    c.showPage()
-                    y = height - 50
+                cur.draw(70, f"• {topic}", "Helvetica", 11)
+                cur.advance(15)
 
         # Recommendations
-        y -= 20
+        cur.advance(20)
         recommendations = result.get("recommended_resources", [])
         if recommendations:
-            c.setFont("Helvetica-Bold", 14)
-            c.drawString(50, y, "Recommended Study Resources:")
-            y -= 20
-            c.setFont("Helvetica", 10)
+            cur.draw(50, "Recommended Study Resources:", "Helvetica-Bold", 14)
+            cur.advance(20)
             for resource in recommendations[:5]:
                 title = resource.get("title", resource.get("name", "Resource"))
-                c.drawString(70, y, f"• {title[:60]}")
-                y -= 15
-                if y < 100:
-                    c.showPage()
-                    y = height - 50
+                cur.draw(70, f"• {title[:60]}", "Helvetica", 10)
+                cur.advance(15)
 
         c.save()
-        buffer.seek(0)
+        pdf_bytes = buffer.getvalue()
+        _release_pdf_buffer(buffer)
 
         return Response(
-            content=buffer.read(),
+            content=pdf_bytes,
             media_type="application/pdf",
             headers={
                 "Content-Disposition": f'attachment; filename="rag_quiz_report_{quiz_result_id}.pdf"'
@@ -1,8 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional, Dict, Any
 
+# Shared base: schemas are read-only once parsed, unknown fields are dropped
+class FrozenSchema(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
 # Midterm Analysis Schemas
-class ErrorItem(BaseModel):
+class ErrorItem(FrozenSchema):
     question: int
     yourAnswer: str
     correctAnswer: str
@@ -12,21 +16,21 @@ class ErrorItem(BaseModel):
     totalMarks: Optional[int] = None
     correctness: Optional[str] = None  # "correct", "incorrect", "partially_correct"
 
-class MidtermAnalysisRequest(BaseModel):
+class MidtermAnalysisRequest(FrozenSchema):
     user_id: str
     course_name: Optional[str] = None
 
-class MidtermAnalysisResponse(BaseModel):
+class MidtermAnalysisResponse(FrozenSchema):
     courseName: str
     examDate: str
     errors: List[ErrorItem]
 
 # Quiz Generation Schemas
-class QuizOption(BaseModel):
+class QuizOption(FrozenSchema):
     id: str
     text: str
 
-class QuizQuestion(BaseModel):
+class QuizQuestion(FrozenSchema):
     id: str
     text: str
     options: List[QuizOption]
@@ -35,7 +39,7 @@ class QuizQuestion(BaseModel):
     topic: Optional[str] = None
     imageUrl: Optional[str] = None
 
-class QuizGenerationRequest(BaseModel):
+class QuizGenerationRequest(FrozenSchema):
     user_id: Optional[str] = None
     title: Optional[str] = None
     topics: Optional[List[str]] = None
@@ -43,30 +47,30 @@ class QuizGenerationRequest(BaseModel):
     uploaded_files: Optional[List[Dict[str, Any]]] = None  # {filename, content}
     subject: Optional[str] = None  # Subject/category name (e.g., "Data Structures & Algorithms")
 
-class QuizGenerationResponse(BaseModel):
+class QuizGenerationResponse(FrozenSchema):
     quiz_id: str
     questions: List[QuizQuestion]
     title: str
 
 # Study Material Schemas
-class StudyMaterial(BaseModel):
+class StudyMaterial(FrozenSchema):
     title: str
     description: str
     url: str
     source: Optional[str] = None
 
-class StudyMaterialRequest(BaseModel):
+class StudyMaterialRequest(FrozenSchema):
     user_id: Optional[str] = None
     topics: List[str]
     context: Optional[str] = None
     difficulty_level: Optional[str] = "intermediate"
     max_results: Optional[int] = 5
 
-class StudyMaterialResponse(BaseModel):
+class StudyMaterialResponse(FrozenSchema):
     materials: List[StudyMaterial]
 
 # User Weakness Schemas
-class UserWeaknessUpdate(BaseModel):
+class UserWeaknessUpdate(FrozenSchema):
     topics: List[str]
     performance_data: Optional[Dict[str, Any]] = None
 
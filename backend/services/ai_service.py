@@ -1,15 +1,237 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
+import asyncio
+import httpx
+import hashlib
 import json
+import orjson
 import re
 import logging
-from typing import List, Dict, Any
+from collections import Counter
+from typing import List, Dict, Any, Optional
 import os
+from cachetools import LRUCache, TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Shared connection pool for all AIService instances so keep-alive
+# connections (and their TLS sessions) are reused across requests
+_HTTP_CLIENT = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+    timeout=120,
+)
+
+# Caps in-flight completions across all callers so bursts of concurrent
+# requests stay under the provider's rate limit. Created on first use:
+# on Python 3.9 asyncio primitives bind to the loop current at construction
+_AI_REQUEST_SLOTS: Optional[asyncio.Semaphore] = None
+
+
+def _request_slots() -> asyncio.Semaphore:
+    """Shared request semaphore, created inside the serving event loop"""
+    global _AI_REQUEST_SLOTS
+    if _AI_REQUEST_SLOTS is None:
+        _AI_REQUEST_SLOTS = asyncio.Semaphore(
+            int(os.getenv("AI_MAX_CONCURRENT_REQUESTS", "8"))
+        )
+    return _AI_REQUEST_SLOTS
+
+# Completed responses keyed by a hash of model, sampling settings and prompt,
+# so re-submitting the same source material skips the LLM round-trip
+_AI_CACHE: TTLCache = TTLCache(maxsize=512, ttl=3600)
+# Quiz titles keyed by normalized (topic set, subject); titles don't go stale
+_TITLE_CACHE: LRUCache = LRUCache(maxsize=1024)
+
+
+# Patterns used by the response parsers, compiled once at import
+_REASONING_OBJ_RE = re.compile(r"\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}", re.DOTALL)
+_REASONING_ARRAY_RE = re.compile(r"\[[^\[\]]*(?:\[[^\[\]]*\][^\[\]]*)*\]", re.DOTALL)
+_ARRAY_RE = re.compile(r"\[.*?\]", re.DOTALL)
+_OBJ_ERRORS_RE = re.compile(r'\{.*?"errors".*?\}', re.DOTALL)
+_ANY_JSON_RE = re.compile(r"\{.*?\}|\[.*?\]", re.DOTALL)
+# Each field is a tempered run that cannot cross its closing label or the next
+# "question N" record, so a record missing a later label fails at the next
+# record instead of backtracking through the rest of the response
+_NOT_PAST = r"(?:(?!{}|question[:\s]+\d).)*"
+_STRUCTURED_ERROR_RE = re.compile(
+    r"question[:\s]+(\d+)"
+    + _NOT_PAST.format("yourAnswer")
+    + r"yourAnswer[:\s]+("
+    + _NOT_PAST.format("correctAnswer")
+    + r")correctAnswer[:\s]+("
+    + _NOT_PAST.format("topic")
+    + r")topic[:\s]+("
+    + _NOT_PAST.format("feedback")
+    + r")feedback[:\s]+(.*?)(?=question|$)",
+    re.IGNORECASE | re.DOTALL,
+)
+_ERROR_OBJ_RE = re.compile(r'\{"question"[^}]*\}', re.DOTALL)
+_CODE_FENCE_RE = re.compile(r"```(?:json)?\s*\[")
+_OPEN_BRACKET_RE = re.compile(r"\[")
+_OPEN_BRACE_RE = re.compile(r"\{")
+_LONG_ARRAY_RE = re.compile(r"(\[[\s\S]{100,}\])")
+_QUESTIONS_OBJ_RE = re.compile(r'(\{[\s\S]*?"questions"[\s\S]*?\})')
+_TRAILING_COMMA_RE = re.compile(r",(\s*[}\]])")
+_NEWLINE_RE = re.compile(r"(?<!\\)\n")
+_COMMENT_RE = re.compile(r"//.*?$", re.MULTILINE)
+_OPTIONS_KEY_RE = re.compile(r'"options"\s*:\s*')
+_QUESTION_LABEL_RE = re.compile(r"(?:Question|Q)\s*\d+", re.IGNORECASE)
+_LABEL_SEPARATOR_RE = re.compile(r"[:\s]+")
+_TITLE_SPLIT_RE = re.compile(r"[\.\n]")
+# Whitespace and quote characters trimmed from the ends of titles and subjects
+_TITLE_STRIP_CHARS = " \t\r\n\"'"
+# Common words skipped when building a fallback title from topic names
+_STOP_WORDS = frozenset({"the", "of", "and", "or", "a", "an", "in", "on", "at"})
+# Subjects too generic to use as a quiz title on their own
+_GENERIC_SUBJECTS = frozenset({"computer science", "cs", "general", "quiz"})
+# Topic substrings that suggest an "Algorithms" or "Structures" title suffix
+_ALGO_KEYWORDS = frozenset({"sort", "search", "traversal", "dfs", "bfs"})
+_STRUCT_KEYWORDS = frozenset({"tree", "graph", "list", "array", "heap"})
+_ALGO_KEYWORDS_RE = re.compile("|".join(sorted(_ALGO_KEYWORDS)))
+_STRUCT_KEYWORDS_RE = re.compile("|".join(sorted(_STRUCT_KEYWORDS)))
+
+_JSON_DECODER = json.JSONDecoder()
+
+# Responses are bounded by max_tokens (~32 KB); anything far beyond that is an
+# upstream concatenation and is truncated before the regex scans run
+_MAX_PARSE_CHARS = 200_000
+
+# Midterm error fields and the response keys they may arrive under, in order
+_ERROR_FIELD_ALIASES = {
+    "question": ("question",),
+    "yourAnswer": ("yourAnswer", "your_answer"),
+    "correctAnswer": ("correctAnswer", "correct_answer"),
+    "topic": ("topic",),
+    "feedback": ("feedback",),
+    "marksReceived": ("marksReceived", "marks_received"),
+    "totalMarks": ("totalMarks", "total_marks"),
+    "correctness": ("correctness", "status", "correctness_status"),
+}
+_ERROR_FIELD_DEFAULTS = {
+    "question": 0,
+    "yourAnswer": "",
+    "correctAnswer": "",
+    "topic": "Unknown",
+    "feedback": "",
+}
+_CORRECTNESS_MAP = {
+    "correct": "correct",
+    "right": "correct",
+    "true": "correct",
+    "incorrect": "incorrect",
+    "wrong": "incorrect",
+    "false": "incorrect",
+    "partially_correct": "partially_correct",
+    "partially correct": "partially_correct",
+    "partial": "partially_correct",
+    "partially": "partially_correct",
+}
+
+# How often each parse_quiz_questions strategy produced the result
+_QUIZ_STRATEGY_HITS: Counter = Counter()
+
+
+def _is_question(obj: Any) -> bool:
+    """Whether a decoded object looks like a quiz question (text + 2 or more options)"""
+    return (
+        isinstance(obj, dict)
+        and "text" in obj
+        and isinstance(obj.get("options"), list)
+        and len(obj["options"]) >= 2
+    )
+
+
+def _thinking_budget(
+    prompt: str, max_tokens: int, thinking_tokens: Optional[int] = None
+) -> Dict[str, int]:
+    """Thinking-token settings for a request, scaled down for short prompts"""
+    if thinking_tokens is None:
+        if len(prompt) < 500:
+            thinking_tokens = 128
+        elif len(prompt) < 2000:
+            thinking_tokens = 512
+        else:
+            # Use up to half of max_tokens for thinking
+            thinking_tokens = min(2048, max_tokens // 2)
+    return {
+        "min_thinking_tokens": min(128, thinking_tokens),
+        "max_thinking_tokens": thinking_tokens,
+    }
+
+
+async def close_http_client():
+    """Close the shared HTTP connection pool (call on application shutdown)"""
+    await _HTTP_CLIENT.aclose()
+
+
+# Prompt for generate_quiz_title, built once; filled in with str.format
+_TITLE_PROMPT_TEMPLATE = """Given these quiz topics: {topics}{subject_context}
+
+Generate a UNIQUE, DESCRIPTIVE 3-6 word title that accurately represents these EXACT topics. 
+The title should be specific and descriptive enough to distinguish this quiz from other quizzes on similar subjects.
+Make it distinctive based on the actual topics provided - use enough words to be clear and specific.
+
+Examples:
+- Topics: "Merge Sort, Quick Sort, Bubble Sort" → Title: "Sorting Algorithms & Techniques" (NOT just "Algorithms" or "Computer Science")
+- Topics: "Binary Trees, Graphs, Linked Lists" → Title: "Data Structures & Tree Algorithms" (NOT just "Data Structures" or "Computer Science")
+- Topics: "Time Complexity, Space Complexity, Big O Notation" → Title: "Algorithm Complexity Analysis" (NOT just "Complexity" or "Computer Science")
+- Topics: "DFS, BFS, Graph Traversal" → Title: "Graph Traversal Algorithms" (NOT just "Graph Algorithms" or "Computer Science")
+- Topics: "Python Loops, While Loops, For Loops" → Title: "Loop Structures & Iteration" (NOT just "Loops" or "Computer Science")
+- Topics: "Memoization, Dynamic Programming, Recursion" → Title: "Dynamic Programming & Recursion" (NOT just "Dynamic Programming" or "Computer Science")
+- Topics: "Binary Search Tree, Balanced BST, Tree Traversal" → Title: "Binary Tree Structures & Traversal" (NOT just "Trees" or "Computer Science")
+- Topics: "Hash Tables, Hash Functions, Collision Resolution" → Title: "Hash Tables & Collision Handling" (NOT just "Hash Tables" or "Computer Science")
+- Topics: "Heap Sort, Priority Queue, Heap Operations" → Title: "Heap Data Structures & Sorting" (NOT just "Heaps" or "Computer Science")
+
+IMPORTANT: 
+- Use 3-6 words to be descriptive and specific
+- Include the main topic categories in the title
+- If multiple related topics → combine them (e.g., "Sorting & Searching Algorithms")
+- If topics are about complexity → use "Complexity Analysis" or "Algorithm Complexity"
+- If topics are about data structures → specify which ones (e.g., "Tree & Graph Structures")
+- DO NOT default to generic "Computer Science" or "Algorithms" - be specific!
+- Make titles distinguishable: "Sorting Algorithms" vs "Graph Algorithms" vs "Complexity Analysis"
+
+Return ONLY the title (3-6 words), nothing else. No quotes, no explanation, just the title."""
+
+
+def _fallback_title(topics: List[str]) -> str:
+    """Build a 3-6 word quiz title from topic names when the AI title is unusable"""
+    if not topics:
+        return "General Quiz"
+
+    # Combine first few topics, taking up to 2 meaningful words from each, and
+    # note in the same pass whether they suggest algorithms or structures
+    topic_parts = []
+    has_algo = has_struct = False
+    for topic in topics[:3]:
+        low = topic.lower()
+        has_algo = has_algo or _ALGO_KEYWORDS_RE.search(low) is not None
+        has_struct = has_struct or _STRUCT_KEYWORDS_RE.search(low) is not None
+        meaningful = [w for w in topic.split() if w.lower() not in _STOP_WORDS]
+        topic_parts.extend(meaningful[:2])
+
+    if not topic_parts:
+        # Last resort: use first topic
+        return topics[0]
+
+    # Create 3-6 word descriptive title
+    title = " ".join(topic_parts[:6])
+    # Add "Algorithms" or "Structures" if not already present and it makes sense
+    title_lower = title.lower()
+    if (
+        "algorithm" not in title_lower
+        and "structure" not in title_lower
+        and "complexity" not in title_lower
+    ):
+        if has_algo:
+            title = f"{title} Algorithms"
+        elif has_struct:
+            title = f"{title} Structures"
+
+    return title[:50]  # Limit to 50 chars
+
 
 class AIService:
     """Service for interacting with Nvidia Nemotron model"""
@@ -17,14 +239,22 @@ class AIService:
     def __init__(self):
         # Get API key from environment variable
         api_key = os.getenv("NVIDIA_API_KEY", "YOUR_NVIDIA_API_KEY_HERE")
-        self.client = OpenAI(
+        self.client = AsyncOpenAI(
             base_url="https://integrate.api.nvidia.com/v1",
             api_key=api_key,
+            http_client=_HTTP_CLIENT,
+            # The SDK retries 429/5xx/connection errors with jittered exponential backoff
+            max_retries=4,
         )
         self.model = "nvidia/nvidia-nemotron-nano-9b-v2"
 
     async def generate_response(
-        self, prompt: str, temperature: float = 0.6, max_tokens: int = 4096
+        self,
+        prompt: str,
+        temperature: float = 0.6,
+        max_tokens: int = 4096,
+        thinking_tokens: Optional[int] = None,
+        cache: bool = False,
     ) -> str:
         """
         Generate response using Nvidia Nemotron model
@@ -33,6 +263,9 @@ class AIService:
             prompt: The prompt to send to the model
             temperature: Sampling temperature (0-1)
             max_tokens: Maximum tokens to generate (default: 4096, can go up to 8192)
+            thinking_tokens: Reasoning budget; defaults to one scaled by prompt length
+            cache: Reuse a stored response for an identical request; only for
+                callers where a repeated answer is wanted, not sampled content
 
         Returns:
             Generated text response
@@ -52,6 +285,18 @@ class AIService:
                 )
                 max_tokens = 8192
 
+            extra_body = _thinking_budget(prompt, max_tokens, thinking_tokens)
+            cache_key = (
+                self._cache_key(prompt, temperature, max_tokens, extra_body)
+                if cache
+                else None
+            )
+            cached = _AI_CACHE.get(cache_key) if cache_key else None
+            if cached is not None:
+                logger.info(f"AI response cache hit ({len(cached)} chars)")
+                return cached
+
+
             logger.info(
                 f"Sending request to Nvidia Nemotron (model: {self.model}, max_tokens: {max_tokens})"
             )
@@ -59,24 +304,22 @@ class AIService:
 
             # Use thinking tokens configuration similar to nvidia_code.py
             # This helps the model reason better and prevents cut-off issues
-            completion = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=temperature,
-                top_p=0.95,
-                max_tokens=max_tokens,
-                frequency_penalty=0,
-                presence_penalty=0,
-                stream=False,
-                extra_body={
-                    "min_thinking_tokens": 512,
-                    "max_thinking_tokens": min(
-                        2048, max_tokens // 2
-                    ),  # Use up to half of max_tokens for thinking
-                },
-            )
+            async with _request_slots():
+                completion = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=temperature,
+                    top_p=0.95,
+                    max_tokens=max_tokens,
+                    frequency_penalty=0,
+                    presence_penalty=0,
+                    stream=False,
+                    extra_body=extra_body,
+                )
 
-            logger.info(f"Received completion object: type={type(completion)}")
+            debug_enabled = logger.isEnabledFor(logging.DEBUG)
+            if debug_enabled:
+                logger.debug("Received completion object: type=%s", type(completion))
 
             # Extract response with better error handling
             if not completion:
@@ -95,7 +338,10 @@ class AIService:
                 raise Exception("AI response choices array is empty")
 
             choice = completion.choices[0]
-            logger.info(f"Choice object: type={type(choice)}, attributes={dir(choice)}")
+            if debug_enabled:
+                logger.debug(
+                    "Choice object: type=%s, attributes=%s", type(choice), dir(choice)
+                )
 
             if not hasattr(choice, "message") or not choice.message:
                 logger.error(f"AI choice has no message. Choice: {choice}")
@@ -103,18 +349,22 @@ class AIService:
                 raise Exception("AI choice has no message")
 
             message = choice.message
-            logger.info(
-                f"Message object: type={type(message)}, attributes={dir(message)}"
-            )
+            if debug_enabled:
+                logger.debug(
+                    "Message object: type=%s, attributes=%s", type(message), dir(message)
+                )
 
             # Check finish_reason to understand why content might be None
             finish_reason = getattr(choice, "finish_reason", None)
-            logger.info(f"Finish reason: {finish_reason}")
+            logger.info("Finish reason: %s", finish_reason)
 
             response_text = message.content
-            logger.info(
-                f"Response text type: {type(response_text)}, length: {len(response_text) if response_text else 0}"
-            )
+            if debug_enabled:
+                logger.debug(
+                    "Response text type: %s, length: %d",
+                    type(response_text),
+                    len(response_text) if response_text else 0,
+                )
 
             # Check if content is None or empty
             if response_text is None:
@@ -122,70 +372,38 @@ class AIService:
                     "AI response content is None - checking for alternative content fields"
                 )
 
-                # For Nvidia Nemotron, content might be in reasoning_content field
-                # Try to access the raw message dict
-                if hasattr(message, "model_dump"):
-                    message_dict = message.model_dump()
-                    logger.info(f"Message dict keys: {message_dict.keys()}")
-
-                    # Check for reasoning_content (used when /think is enabled or model uses reasoning)
-                    if (
-                        "reasoning_content" in message_dict
-                        and message_dict["reasoning_content"]
-                    ):
-                        reasoning = message_dict["reasoning_content"]
-                        logger.info(
-                            f"Found reasoning_content with {len(reasoning)} characters"
-                        )
-                        logger.info(
-                            f"Reasoning preview (first 500 chars): {reasoning[:500]}"
-                        )
+                # For Nvidia Nemotron, content might be in reasoning_content field.
+                # Fields unknown to the SDK schema are kept in model_extra as a plain
+                # dict; only dump the whole message if that isn't available
+                message_dict = getattr(message, "model_extra", None)
+                if message_dict is None:
+                    message_dict = (
+                        message.model_dump(exclude_none=True)
+                        if hasattr(message, "model_dump")
+                        else {}
+                    )
+                logger.info(f"Message dict keys: {message_dict.keys()}")
 
-                        # Try to extract JSON from reasoning_content if it contains the answer
-                        # Sometimes the model puts the final answer in reasoning_content
-                        if "{" in reasoning or "[" in reasoning:
-                            # Look for JSON in reasoning_content
-                            import re
+                # Check for reasoning_content (used when /think is enabled or model uses reasoning)
+                reasoning = message_dict.get("reasoning_content")
+                if reasoning:
+                    logger.info(
+                        f"Found reasoning_content with {len(reasoning)} characters"
+                    )
+                    logger.info(
+                        f"Reasoning preview (first 500 chars): {reasoning[:500]}"
+                    )
 
-                            json_match = re.search(
-                                r"\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}", reasoning, re.DOTALL
-                            )
-                            if not json_match:
-                                json_match = re.search(
-                                    r"\[[^\[\]]*(?:\[[^\[\]]*\][^\[\]]*)*\]",
-                                    reasoning,
-                                    re.DOTALL,
-                                )
-
-                            if json_match:
-                                response_text = json_match.group(0)
-                                logger.info(
-                                    f"Extracted JSON from reasoning_content: {len(response_text)} chars"
-                                )
-                            else:
-                                # Use reasoning_content as fallback if it seems to contain the answer
-                                # Check if reasoning ends with something that looks like a response
-                                if (
-                                    "subject" in reasoning.lower()
-                                    or "topics" in reasoning.lower()
-                                ):
-                                    response_text = reasoning
-                                    logger.info(
-                                        "Using reasoning_content as response (contains subject/topics)"
-                                    )
-                        else:
-                            # Use reasoning_content as fallback
-                            response_text = reasoning
-                            logger.info("Using reasoning_content as response")
+                    response_text = self._response_from_reasoning(reasoning)
 
                 # Try to get alternative content or return empty string
                 # Some models might return content in different fields
-                if response_text is None and hasattr(message, "text"):
-                    response_text = message.text
+                if response_text is None and "text" in message_dict:
+                    response_text = message_dict["text"]
                     logger.info(
                         f"Found content in 'text' field: {len(response_text) if response_text else 0} chars"
                     )
-                elif response_text is None and hasattr(message, "role"):
+                elif response_text is None and getattr(message, "role", None):
                     logger.warning(f"Message has role: {message.role}, but no content")
 
                 # If still None and finish_reason indicates content filtering, log it
@@ -209,12 +427,200 @@ class AIService:
             logger.info(
                 f"Successfully extracted {len(response_text)} characters from AI response"
             )
+            if cache_key:
+                _AI_CACHE[cache_key] = response_text
             return response_text
 
         except Exception as e:
             logger.error(f"AI generation failed: {str(e)}")
             raise Exception(f"Failed to generate AI response: {str(e)}")
 
+    def _cache_key(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        extra_body: Dict[str, Any],
+    ) -> str:
+        """Key for _AI_CACHE covering every setting that changes the response"""
+        return hashlib.sha256(
+            f"{self.model}|{temperature}|{max_tokens}|"
+            f"{extra_body['max_thinking_tokens']}|{prompt}".encode()
+        ).hexdigest()
+
+    def _response_from_reasoning(self, reasoning: str) -> Optional[str]:
+        """Recover the answer from reasoning_content when content is empty"""
+        # Try to extract JSON from reasoning_content if it contains the answer
+        # Sometimes the model puts the final answer in reasoning_content
+        if "{" in reasoning or "[" in reasoning:
+            # Look for JSON in reasoning_content
+            json_match = _REASONING_OBJ_RE.search(reasoning)
+            if not json_match:
+                json_match = _REASONING_ARRAY_RE.search(reasoning)
+
+            if json_match:
+                response_text = json_match.group(0)
+                logger.info(
+                    f"Extracted JSON from reasoning_content: {len(response_text)} chars"
+                )
+                return response_text
+
+            # Use reasoning_content as fallback if it seems to contain the answer
+            # Check if reasoning ends with something that looks like a response
+            if "subject" in reasoning.lower() or "topics" in reasoning.lower():
+                logger.info(
+                    "Using reasoning_content as response (contains subject/topics)"
+                )
+                return reasoning
+            return None
+
+        # Use reasoning_content as fallback
+        logger.info("Using reasoning_content as response")
+        return reasoning
+
+    async def generate_array_response(
+        self,
+        prompt: str,
+        temperature: float = 0.6,
+        max_tokens: int = 4096,
+        cache: bool = False,
+        min_items: int = 1,
+    ) -> str:
+        """
+        Stream a completion that should contain a JSON array, returning as soon
+        as a complete array of objects has arrived instead of waiting for the
+        model to finish
+
+        Args:
+            prompt: The prompt to send to the model
+            temperature: Sampling temperature (0-1)
+            max_tokens: Maximum tokens to generate (clamped to 2048-8192)
+            cache: Reuse a stored response for an identical request
+            min_items: Keep streaming until an array of at least this many
+                questions arrives (e.g. the number requested)
+
+        Returns:
+            Generated text response, up to and including the first complete array
+        """
+        slot_acquired = False
+        try:
+            max_tokens = min(max(max_tokens, 2048), 8192)
+
+            extra_body = _thinking_budget(prompt, max_tokens)
+            cache_key = (
+                self._cache_key(prompt, temperature, max_tokens, extra_body)
+                if cache
+                else None
+            )
+            cached = _AI_CACHE.get(cache_key) if cache_key else None
+            if cached is not None:
+                logger.info(f"AI response cache hit ({len(cached)} chars)")
+                return cached
+
+            logger.info(
+                f"Streaming request to Nvidia Nemotron (model: {self.model}, max_tokens: {max_tokens})"
+            )
+            # Hold a request slot until the stream has been consumed or closed
+            slots = _request_slots()
+            await slots.acquire()
+            slot_acquired = True
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=temperature,
+                top_p=0.95,
+                max_tokens=max_tokens,
+                frequency_penalty=0,
+                presence_penalty=0,
+                stream=True,
+                extra_body=extra_body,
+            )
+
+            parts = []
+            reasoning_parts = []
+            length = 0
+            array_start = None
+            depth = 0
+            in_string = False
+            escape_next = False
+            response_text = None
+
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                reasoning = (getattr(delta, "model_extra", None) or {}).get(
+                    "reasoning_content"
+                )
+                if reasoning:
+                    reasoning_parts.append(reasoning)
+                content = delta.content
+                if not content:
+                    continue
+                parts.append(content)
+
+                # Track bracket depth incrementally, ignoring brackets in strings
+                for offset, char in enumerate(content, length):
+                    if depth == 0:
+                        if char == "[":
+                            array_start = offset
+                            depth = 1
+                        continue
+                    if escape_next:
+                        escape_next = False
+                    elif char == "\\":
+                        escape_next = in_string
+                    elif char == '"':
+                        in_string = not in_string
+                    elif in_string:
+                        continue
+                    elif char == "[":
+                        depth += 1
+                    elif char == "]":
+                        depth -= 1
+                        if depth == 0:
+                            text = "".join(parts)
+                            try:
+                                array, _ = _JSON_DECODER.raw_decode(text, array_start)
+                            except json.JSONDecodeError:
+                                continue
+                            if len(array) >= min_items and all(
+                                _is_question(item) for item in array
+                            ):
+                                response_text = text[: offset + 1]
+                                break
+                length += len(content)
+                if response_text is not None:
+                    break
+
+            if response_text is not None:
+                # Stop generation early; the rest of the output is not needed
+                await stream.response.aclose()
+                logger.info(
+                    f"Complete JSON array received after {len(response_text)} characters"
+                )
+            else:
+                response_text = "".join(parts)
+                if not response_text.strip() and reasoning_parts:
+                    response_text = (
+                        self._response_from_reasoning("".join(reasoning_parts)) or ""
+                    )
+
+            if not response_text.strip():
+                logger.warning("AI response content is empty string")
+                return ""
+
+            if cache_key:
+                _AI_CACHE[cache_key] = response_text
+            return response_text
+
+        except Exception as e:
+            logger.error(f"AI generation failed: {str(e)}")
+            raise Exception(f"Failed to generate AI response: {str(e)}")
+        finally:
+            if slot_acquired:
+                slots.release()
+
     async def parse_midterm_analysis(self, ai_response: str) -> List[Dict[str, Any]]:
         """
         Parse AI response to extract midterm errors with enhanced fields
@@ -227,31 +633,35 @@ class AIService:
             topic, feedback, marksReceived, totalMarks, correctness
         """
         try:
+            ai_response = ai_response[:_MAX_PARSE_CHARS]
+
             # Try multiple JSON extraction strategies (similar to parse_quiz_questions)
             json_str = None
 
-            # Strategy 1: Look for JSON array
-            array_match = re.search(r"\[.*?\]", ai_response, re.DOTALL)
-            if array_match:
-                json_str = array_match.group(0)
-
-            # Strategy 2: Look for JSON object with errors key
-            if not json_str:
-                obj_match = re.search(r'\{.*?"errors".*?\}', ai_response, re.DOTALL)
-                if obj_match:
-                    json_str = obj_match.group(0)
-
-            # Strategy 3: Look for any JSON object/array
-            if not json_str:
-                json_match = re.search(r"\{.*?\}|\[.*?\]", ai_response, re.DOTALL)
-                if json_match:
-                    json_str = json_match.group(0)
+            # Skip the DOTALL scans entirely for pure prose (refusals, filtered output)
+            if "[" in ai_response or "{" in ai_response:
+                # Strategy 1: Look for JSON array
+                array_match = _ARRAY_RE.search(ai_response)
+                if array_match:
+                    json_str = array_match.group(0)
+
+                # Strategy 2: Look for JSON object with errors key
+                if not json_str:
+                    obj_match = _OBJ_ERRORS_RE.search(ai_response)
+                    if obj_match:
+                        json_str = obj_match.group(0)
+
+                # Strategy 3: Look for any JSON object/array
+                if not json_str:
+                    json_match = _ANY_JSON_RE.search(ai_response)
+                    if json_match:
+                        json_str = json_match.group(0)
 
             if json_str:
                 try:
                     # Try to fix common JSON issues
                     json_str = self._fix_json(json_str)
-                    data = json.loads(json_str)
+                    data = orjson.loads(json_str)
 
                     # Handle different response formats
                     if isinstance(data, dict) and "errors" in data:
@@ -266,41 +676,32 @@ class AIService:
                     # Ensure all errors have required fields with defaults
                     normalized_errors = []
                     for error in errors:
-                        # Get marks to help determine correctness
-                        marks_received = error.get("marksReceived") or error.get(
-                            "marks_received"
-                        )
-                        total_marks = error.get("totalMarks") or error.get(
-                            "total_marks"
-                        )
+                        # Take each field from the first alias that is present
+                        normalized_error = {}
+                        for field, aliases in _ERROR_FIELD_ALIASES.items():
+                            for alias in aliases:
+                                value = error.get(alias)
+                                # Empty strings count as missing, like null, so
+                                # e.g. "correctness": "" falls through to "status"
+                                if value is not None and value != "":
+                                    break
+                            else:
+                                value = _ERROR_FIELD_DEFAULTS.get(field)
+                            normalized_error[field] = value
 
-                        # Normalize correctness field - handle various formats
-                        correctness = (
-                            error.get("correctness")
-                            or error.get("status")
-                            or error.get("correctness_status")
-                        )
+                        # Normalize correctness field - handle various formats;
+                        # unknown values fall through to inference from marks
+                        correctness = normalized_error["correctness"]
                         if correctness:
-                            # Normalize to lowercase and handle variations
-                            correctness_lower = str(correctness).lower().strip()
-                            if correctness_lower in ["correct", "right", "true"]:
-                                correctness = "correct"
-                            elif correctness_lower in ["incorrect", "wrong", "false"]:
-                                correctness = "incorrect"
-                            elif correctness_lower in [
-                                "partially_correct",
-                                "partially correct",
-                                "partial",
-                                "partially",
-                            ]:
-                                correctness = "partially_correct"
-                            else:
-                                # If correctness is unknown, try to infer from marks
-                                correctness = None
+                            correctness = _CORRECTNESS_MAP.get(
+                                str(correctness).lower().strip()
+                            )
                         else:
                             correctness = None
 
                         # If correctness is not set or unknown, calculate from marks
+                        marks_received = normalized_error["marksReceived"]
+                        total_marks = normalized_error["totalMarks"]
                         if (
                             correctness is None
                             and marks_received is not None
@@ -317,20 +718,7 @@ class AIService:
                             # Default to incorrect if we can't determine
                             correctness = "incorrect"
 
-                        normalized_error = {
-                            "question": error.get("question", 0),
-                            "yourAnswer": error.get(
-                                "yourAnswer", error.get("your_answer", "")
-                            ),
-                            "correctAnswer": error.get(
-                                "correctAnswer", error.get("correct_answer", "")
-                            ),
-                            "topic": error.get("topic", "Unknown"),
-                            "feedback": error.get("feedback", ""),
-                            "marksReceived": marks_received,
-                            "totalMarks": total_marks,
-                            "correctness": correctness,
-                        }
+                        normalized_error["correctness"] = correctness
                         normalized_errors.append(normalized_error)
 
                     if normalized_errors:
@@ -350,8 +738,7 @@ class AIService:
 
             # If no JSON found, try to parse structured text
             errors = []
-            error_pattern = r"question[:\s]+(\d+).*?yourAnswer[:\s]+(.*?)correctAnswer[:\s]+(.*?)topic[:\s]+(.*?)feedback[:\s]+(.*?)(?=question|$)"
-            matches = re.finditer(error_pattern, ai_response, re.IGNORECASE | re.DOTALL)
+            matches = _STRUCTURED_ERROR_RE.finditer(ai_response)
 
             for match in matches:
                 errors.append(
@@ -383,184 +770,58 @@ class AIService:
         """Extract individual error objects from broken JSON"""
         errors = []
         # Look for individual error objects
-        error_pattern = r'\{"question"[^}]*\}'
-        matches = re.finditer(error_pattern, json_str, re.DOTALL)
+        matches = _ERROR_OBJ_RE.finditer(json_str)
         for match in matches:
             try:
-                error_obj = json.loads(match.group(0))
+                error_obj = orjson.loads(match.group(0))
                 errors.append(error_obj)
             except:
                 continue
         return errors
 
     async def parse_quiz_questions(self, ai_response: str) -> List[Dict[str, Any]]:
-        # Log first 1000 chars for debugging
-        logger.info(f"AI response preview (first 1000 chars): {ai_response[:1000]}")
         """
         Parse AI response to extract quiz questions
-        
+
+        Strategies are tried in order of how often they succeed and the first
+        non-empty result wins; per-strategy hit counts are kept in
+        _QUIZ_STRATEGY_HITS so the order can be tuned from logs.
+
         Args:
             ai_response: Raw AI response text
-        
+
         Returns:
             List of question dictionaries
         """
+        # Log first 1000 chars for debugging
+        logger.info(f"AI response preview (first 1000 chars): {ai_response[:1000]}")
         try:
-            # Try multiple strategies to extract JSON
-
-            # Strategy 1: Find JSON array with code block markers
-            code_block_match = re.search(
-                r"```(?:json)?\s*(\[.*?\])\s*```", ai_response, re.DOTALL
-            )
-            if code_block_match:
-                json_str = code_block_match.group(1)
-                try:
-                    questions = json.loads(json_str)
-                    if isinstance(questions, list) and len(questions) > 0:
-                        logger.info(
-                            f"Successfully parsed {len(questions)} questions from code block"
-                        )
-                        return questions
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Failed to parse code block JSON: {e}")
-
-            # Strategy 2: Find JSON array directly (more lenient - find largest array)
-            # Try to find the array by looking for [ ... ] pattern
-            # Use non-greedy but with minimum length
-            json_matches = list(re.finditer(r"\[", ai_response))
-            best_match = None
-            best_questions = []
-
-            for start_match in json_matches:
-                start_pos = start_match.start()
-                # Try to find matching closing bracket
-                bracket_count = 0
-                end_pos = start_pos
-                for i, char in enumerate(ai_response[start_pos:], start_pos):
-                    if char == "[":
-                        bracket_count += 1
-                    elif char == "]":
-                        bracket_count -= 1
-                        if bracket_count == 0:
-                            end_pos = i + 1
-                            break
-
-                if end_pos > start_pos:
-                    json_str = ai_response[start_pos:end_pos]
-                    if len(json_str) > 100:  # Reasonable minimum
-                        try:
-                            questions = json.loads(json_str)
-                            if isinstance(questions, list) and len(questions) > len(
-                                best_questions
-                            ):
-                                best_match = json_str
-                                best_questions = questions
-                        except json.JSONDecodeError:
-                            # Try fixing
-                            fixed = self._fix_json(json_str)
-                            try:
-                                questions = json.loads(fixed)
-                                if isinstance(questions, list) and len(questions) > len(
-                                    best_questions
-                                ):
-                                    best_match = fixed
-                                    best_questions = questions
-                            except:
-                                # Try extracting individual questions
-                                extracted = self._extract_questions_from_broken_json(
-                                    json_str
-                                )
-                                if len(extracted) > len(best_questions):
-                                    best_questions = extracted
-
-            if best_questions:
-                logger.info(
-                    f"Successfully parsed {len(best_questions)} questions from JSON array"
+            ai_response = ai_response[:_MAX_PARSE_CHARS]
+            if "[" in ai_response or "{" in ai_response:
+                strategies = (
+                    self._try_code_block,
+                    self._try_json_arrays,
+                    self._try_long_array,
+                    self._try_questions_object,
+                    self._try_broken_json,
+                    self._extract_questions_from_text,
                 )
-                return best_questions
+            else:
+                # Pure prose: only the plain-text strategy can match
+                strategies = (self._extract_questions_from_text,)
 
-            # Fallback: try simple regex match
-            json_match = re.search(r"(\[[\s\S]{100,}\])", ai_response)
-            if json_match:
-                json_str = json_match.group(1)
-                logger.debug(
-                    f"Trying to parse JSON (first 500 chars): {json_str[:500]}"
-                )
-                try:
-                    questions = json.loads(json_str)
-                    if isinstance(questions, list) and len(questions) > 0:
-                        logger.info(
-                            f"Successfully parsed {len(questions)} questions from JSON array"
-                        )
-                        return questions
-                except json.JSONDecodeError as e:
-                    logger.warning(
-                        f"Failed to parse JSON array: {e} at position {e.pos}"
+            for strategy in strategies:
+                questions = strategy(ai_response)
+                if questions:
+                    _QUIZ_STRATEGY_HITS[strategy.__name__] += 1
+                    logger.info(
+                        f"Parsed {len(questions)} questions via {strategy.__name__} "
+                        f"(strategy hits: {dict(_QUIZ_STRATEGY_HITS)})"
                     )
-                    # Try to fix common JSON issues
-                    json_str = self._fix_json(json_str)
-                    try:
-                        questions = json.loads(json_str)
-                        if isinstance(questions, list) and len(questions) > 0:
-                            logger.info(
-                                f"Successfully parsed {len(questions)} questions after fixing JSON"
-                            )
-                            return questions
-                    except json.JSONDecodeError as e2:
-                        logger.warning(f"Still failed after fixing: {e2}")
-                        # Try to extract valid JSON objects from the array
-                        questions = self._extract_questions_from_broken_json(json_str)
-                        if questions:
-                            logger.info(
-                                f"Extracted {len(questions)} questions from broken JSON"
-                            )
-                            return questions
-
-                        # If still no questions, try extracting from the original response
-                        # (might be truncated before the closing bracket)
-                        questions = self._extract_questions_from_broken_json(
-                            ai_response
-                        )
-                        if questions:
-                            logger.info(
-                                f"Extracted {len(questions)} questions from full response"
-                            )
-                            return questions
-
-            # Strategy 3: Find JSON object with questions key
-            json_match = re.search(r'(\{[\s\S]*?"questions"[\s\S]*?\})', ai_response)
-            if json_match:
-                json_str = json_match.group(1)
-                try:
-                    data = json.loads(json_str)
-                    if isinstance(data, dict) and "questions" in data:
-                        questions = data["questions"]
-                        if isinstance(questions, list) and len(questions) > 0:
-                            logger.info(
-                                f"Successfully parsed {len(questions)} questions from JSON object"
-                            )
-                            return questions
-                except json.JSONDecodeError as e:
-                    logger.warning(f"Failed to parse JSON object: {e}")
-
-            # Strategy 4: Try to extract questions from broken/incomplete JSON in full response
-            # This handles cases where the JSON array was truncated
-            questions = self._extract_questions_from_broken_json(ai_response)
-            if questions:
-                logger.info(
-                    f"Extracted {len(questions)} questions from incomplete JSON in full response"
-                )
-                return questions
-
-            # Strategy 5: Try to extract questions manually from text
-            questions = self._extract_questions_from_text(ai_response)
-            if questions:
-                logger.info(
-                    f"Successfully extracted {len(questions)} questions from text"
-                )
-                return questions
+                    return questions
 
             # Fallback: return empty list
+            _QUIZ_STRATEGY_HITS["none"] += 1
             logger.warning("Could not parse quiz questions, returning empty list")
             logger.debug(
                 f"AI response preview (first 2000 chars): {ai_response[:2000]}"
@@ -572,15 +833,118 @@ class AIService:
             logger.error(f"Failed to parse quiz questions: {str(e)}", exc_info=True)
             return []
 
+    def _try_code_block(self, ai_response: str) -> List[Dict[str, Any]]:
+        """Strategy 1: decode the JSON array that opens a ``` code block"""
+        fence_match = _CODE_FENCE_RE.search(ai_response)
+        if not fence_match:
+            return []
+        try:
+            questions, _ = _JSON_DECODER.raw_decode(ai_response, fence_match.end() - 1)
+        except json.JSONDecodeError as e:
+            logger.warning(f"Failed to parse code block JSON: {e}")
+            return []
+        if isinstance(questions, list):
+            return questions
+        return []
+
+    def _try_json_arrays(self, ai_response: str) -> List[Dict[str, Any]]:
+        """Strategy 2: decode from each "[" and keep the largest array"""
+        # raw_decode parses from each "[" in C and reports where the
+        # document ends, so nested arrays inside a decoded one are skipped
+        best_questions = []
+        resume_pos = 0
+        tried_broken = False
+
+        for start_match in _OPEN_BRACKET_RE.finditer(ai_response):
+            start_pos = start_match.start()
+            if start_pos < resume_pos:
+                continue
+            try:
+                questions, end_pos = _JSON_DECODER.raw_decode(ai_response, start_pos)
+                length = end_pos - start_pos
+                resume_pos = end_pos
+            except json.JSONDecodeError:
+                # Try fixing
+                fixed = self._fix_json(ai_response[start_pos:])
+                try:
+                    questions, length = _JSON_DECODER.raw_decode(fixed)
+                except json.JSONDecodeError:
+                    # Try extracting individual questions; later starts are
+                    # suffixes of this one, so one pass covers them all
+                    if not tried_broken:
+                        tried_broken = True
+                        extracted = self._extract_questions_from_broken_json(
+                            ai_response[start_pos:]
+                        )
+                        if len(extracted) > len(best_questions):
+                            best_questions = extracted
+                    continue
+
+            if length <= 100:  # Reasonable minimum
+                continue
+            if isinstance(questions, list) and len(questions) > len(best_questions):
+                best_questions = questions
+
+        return best_questions
+
+    def _try_long_array(self, ai_response: str) -> List[Dict[str, Any]]:
+        """Fallback for strategy 2: greedy regex match of a long array"""
+        json_match = _LONG_ARRAY_RE.search(ai_response)
+        if not json_match:
+            return []
+        json_str = json_match.group(1)
+        logger.debug(f"Trying to parse JSON (first 500 chars): {json_str[:500]}")
+        try:
+            questions = orjson.loads(json_str)
+            if isinstance(questions, list):
+                return questions
+            return []
+        except json.JSONDecodeError as e:
+            logger.warning(f"Failed to parse JSON array: {e} at position {e.pos}")
+
+        # Try to fix common JSON issues
+        json_str = self._fix_json(json_str)
+        try:
+            questions = orjson.loads(json_str)
+            if isinstance(questions, list):
+                return questions
+            return []
+        except json.JSONDecodeError as e2:
+            logger.warning(f"Still failed after fixing: {e2}")
+
+        # Try to extract valid JSON objects from the array; if that fails too,
+        # the full response may be truncated before the closing bracket
+        return self._extract_questions_from_broken_json(
+            json_str
+        ) or self._extract_questions_from_broken_json(ai_response)
+
+    def _try_questions_object(self, ai_response: str) -> List[Dict[str, Any]]:
+        """Strategy 3: find a JSON object with a "questions" key"""
+        json_match = _QUESTIONS_OBJ_RE.search(ai_response)
+        if not json_match:
+            return []
+        try:
+            data = orjson.loads(json_match.group(1))
+        except json.JSONDecodeError as e:
+            logger.warning(f"Failed to parse JSON object: {e}")
+            return []
+        if isinstance(data, dict) and isinstance(data.get("questions"), list):
+            return data["questions"]
+        return []
+
+    def _try_broken_json(self, ai_response: str) -> List[Dict[str, Any]]:
+        """Strategy 4: extract question objects from truncated JSON"""
+        return self._extract_questions_from_broken_json(ai_response)
+
     def _fix_json(self, json_str: str) -> str:
         """Try to fix common JSON issues"""
         # Remove trailing commas before } or ]
-        json_str = re.sub(r",(\s*[}\]])", r"\1", json_str)
+        json_str = _TRAILING_COMMA_RE.sub(r"\1", json_str)
         # Fix unescaped newlines in strings
-        json_str = re.sub(r"(?<!\\)\n", "\\n", json_str)
+        json_str = _NEWLINE_RE.sub("\\n", json_str)
         # Fix unescaped quotes in strings (be careful)
         # Remove comments (JSON doesn't support them)
-        json_str = re.sub(r"//.*?$", "", json_str, flags=re.MULTILINE)
+        json_str = _COMMENT_RE.sub("", json_str)
         return json_str
 
     def _extract_questions_from_broken_json(
@@ -589,117 +953,62 @@ class AIService:
         """Extract question objects from broken or truncated JSON array"""
         questions = []
 
-        # Strategy 1: Try to find complete question objects using balanced braces
-        # This handles nested structures better than simple regex
-        i = 0
-        while i < len(json_str):
-            # Find start of an object
-            if json_str[i] == "{":
-                brace_count = 0
-                start_pos = i
-                in_string = False
-                escape_next = False
-
-                # Find the matching closing brace
-                for j in range(i, len(json_str)):
-                    char = json_str[j]
-
-                    if escape_next:
-                        escape_next = False
-                        continue
-
-                    if char == "\\":
-                        escape_next = True
-                        continue
-
-                    if char == '"' and not escape_next:
-                        in_string = not in_string
-                        continue
+        # Strategy 1: Try to find complete question objects by decoding from
+        # each "{"; raw_decode handles nesting and string escapes natively
+        resume_pos = 0
+        for start_match in _OPEN_BRACE_RE.finditer(json_str):
+            start_pos = start_match.start()
+            if start_pos < resume_pos:
+                continue
+            try:
+                obj, resume_pos = _JSON_DECODER.raw_decode(json_str, start_pos)
+            except json.JSONDecodeError:
+                # Object is incomplete or malformed, look inside it
+                continue
 
-                    if not in_string:
-                        if char == "{":
-                            brace_count += 1
-                        elif char == "}":
-                            brace_count -= 1
-                            if brace_count == 0:
-                                # Found complete object
-                                obj_str = json_str[start_pos : j + 1]
-                                try:
-                                    obj = json.loads(obj_str)
-                                    # Check if it looks like a question object
-                                    if (
-                                        isinstance(obj, dict)
-                                        and "text" in obj
-                                        and "options" in obj
-                                    ):
-                                        # Validate that options is a list with at least 2 items
-                                        if (
-                                            isinstance(obj.get("options"), list)
-                                            and len(obj.get("options", [])) >= 2
-                                        ):
-                                            # Ensure required fields
-                                            if not obj.get("id"):
-                                                obj["id"] = str(len(questions) + 1)
-                                            if not obj.get("correctAnswer"):
-                                                obj["correctAnswer"] = "a"
-                                            if not obj.get("explanation"):
-                                                obj["explanation"] = (
-                                                    "Generated question"
-                                                )
-                                            if not obj.get("topic"):
-                                                obj["topic"] = "General"
-                                            questions.append(obj)
-                                            logger.info(
-                                                f"Extracted complete question {obj.get('id')}: {obj.get('text', '')[:50]}..."
-                                            )
-                                except json.JSONDecodeError:
-                                    # Object is incomplete or malformed, skip it
-                                    pass
-                                except Exception as e:
-                                    logger.debug(f"Error parsing object: {e}")
-
-                                i = j + 1
-                                break
-                else:
-                    # No closing brace found, object is incomplete - skip it
-                    i += 1
-            else:
-                i += 1
+            # Check if it looks like a question object
+            if _is_question(obj):
+                # Ensure required fields
+                if not obj.get("id"):
+                    obj["id"] = str(len(questions) + 1)
+                if not obj.get("correctAnswer"):
+                    obj["correctAnswer"] = "a"
+                if not obj.get("explanation"):
+                    obj["explanation"] = "Generated question"
+                if not obj.get("topic"):
+                    obj["topic"] = "General"
+                questions.append(obj)
+                logger.info(
+                    f"Extracted complete question {obj.get('id')}: {obj.get('text', '')[:50]}..."
+                )
 
-        # Strategy 2: Fallback to regex if no questions found (for simpler cases)
+        # Strategy 2: Fallback for objects truncated after their options array.
+        # Decode each options array in place, then close the object it belongs to
         if not questions:
-            question_pattern = r'\{"id"\s*:\s*"[^"]*"\s*,\s*"text"\s*:\s*"[^"]*"\s*,\s*"options"\s*:\s*\[[^\]]*\]'
-            matches = re.finditer(question_pattern, json_str, re.DOTALL)
-
-            for i, match in enumerate(matches, 1):
-                obj_str = match.group(0)
+            for options_match in _OPTIONS_KEY_RE.finditer(json_str):
                 try:
-                    # Try to complete the object by adding missing closing braces
-                    if not obj_str.endswith("}"):
-                        # Try to find where options array ends
-                        options_match = re.search(
-                            r'"options"\s*:\s*\[.*?\]', obj_str, re.DOTALL
-                        )
-                        if options_match:
-                            options_end = options_match.end()
-                            # Try to extract what we have and add closing brace
-                            partial_obj = obj_str[:options_end] + "}"
-                            try:
-                                obj = json.loads(partial_obj)
-                                if "text" in obj and "options" in obj:
-                                    if not obj.get("id"):
-                                        obj["id"] = str(i)
-                                    if not obj.get("correctAnswer"):
-                                        obj["correctAnswer"] = "a"
-                                    if not obj.get("explanation"):
-                                        obj["explanation"] = "Generated question"
-                                    if not obj.get("topic"):
-                                        obj["topic"] = "General"
-                                    questions.append(obj)
-                            except:
-                                pass
-                except:
+                    _, options_end = _JSON_DECODER.raw_decode(
+                        json_str, options_match.end()
+                    )
+                except json.JSONDecodeError:
                     continue
+                start_pos = json_str.rfind("{", 0, options_match.start())
+                if start_pos == -1:
+                    continue
+                try:
+                    obj = orjson.loads(json_str[start_pos:options_end] + "}")
+                except orjson.JSONDecodeError:
+                    continue
+                if isinstance(obj, dict) and "text" in obj and "options" in obj:
+                    if not obj.get("id"):
+                        obj["id"] = str(len(questions) + 1)
+                    if not obj.get("correctAnswer"):
+                        obj["correctAnswer"] = "a"
+                    if not obj.get("explanation"):
+                        obj["explanation"] = "Generated question"
+                    if not obj.get("topic"):
+                        obj["topic"] = "General"
+                    questions.append(obj)
 
         logger.info(f"Extracted {len(questions)} complete questions from broken JSON")
         return questions
@@ -707,12 +1016,18 @@ class AIService:
     def _extract_questions_from_text(self, text: str) -> List[Dict[str, Any]]:
         """Extract questions from unstructured text as fallback"""
         questions = []
-        # Look for question patterns
-        question_pattern = r"(?:Question|Q)\s*\d+[:\s]+(.+?)(?=(?:Question|Q)\s*\d+|$)"
-        matches = re.finditer(question_pattern, text, re.IGNORECASE | re.DOTALL)
+        # Look for "Question N:" labels; each question runs until the next label.
+        # Slicing between label positions keeps this linear (no lazy lookahead scan)
+        labels = list(_QUESTION_LABEL_RE.finditer(text))
+        i = 0
 
-        for i, match in enumerate(matches, 1):
-            question_text = match.group(1).strip()
+        for index, label in enumerate(labels):
+            separator = _LABEL_SEPARATOR_RE.match(text, label.end())
+            if not separator:
+                continue
+            i += 1
+            end = labels[index + 1].start() if index + 1 < len(labels) else len(text)
+            question_text = text[separator.end() : end].strip()
             if len(question_text) > 20:  # Valid question length
                 questions.append(
                     {
@@ -746,14 +1061,9 @@ class AIService:
         try:
             # If subject is provided, we can use it as a base but make it more descriptive with topics
             if subject and len(subject.strip()) > 0:
-                subject_clean = subject.strip().strip('"').strip("'")
+                subject_clean = subject.strip(_TITLE_STRIP_CHARS)
                 # If subject is generic like "Computer Science", combine it with topics for specificity
-                if subject_clean.lower() in [
-                    "computer science",
-                    "cs",
-                    "general",
-                    "quiz",
-                ]:
+                if subject_clean.lower() in _GENERIC_SUBJECTS:
                     # Don't use generic subject alone - will generate descriptive title below
                     subject_clean = None
                 elif len(subject_clean.split()) <= 6:
@@ -764,36 +1074,22 @@ class AIService:
             if not topics or len(topics) == 0:
                 return "General Quiz"
 
+            # The same topic set (in any order) with the same subject gets the same title
+            title_key = (
+                frozenset(t.strip().lower() for t in topics[:10]),
+                (subject or "").strip().lower(),
+            )
+            cached_title = _TITLE_CACHE.get(title_key)
+            if cached_title is not None:
+                logger.info(f"Using cached quiz title: '{cached_title}'")
+                return cached_title
+
             # Create prompt for AI to generate a descriptive title
             topics_str = ", ".join(topics[:10])  # Limit to first 10 topics
             subject_context = f"\nSubject context: {subject}" if subject else ""
-            prompt = f"""Given these quiz topics: {topics_str}{subject_context}
-
-Generate a UNIQUE, DESCRIPTIVE 3-6 word title that accurately represents these EXACT topics. 
-The title should be specific and descriptive enough to distinguish this quiz from other quizzes on similar subjects.
-Make it distinctive based on the actual topics provided - use enough words to be clear and specific.
-
-Examples:
-- Topics: "Merge Sort, Quick Sort, Bubble Sort" → Title: "Sorting Algorithms & Techniques" (NOT just "Algorithms" or "Computer Science")
-- Topics: "Binary Trees, Graphs, Linked Lists" → Title: "Data Structures & Tree Algorithms" (NOT just "Data Structures" or "Computer Science")
-- Topics: "Time Complexity, Space Complexity, Big O Notation" → Title: "Algorithm Complexity Analysis" (NOT just "Complexity" or "Computer Science")
-- Topics: "DFS, BFS, Graph Traversal" → Title: "Graph Traversal Algorithms" (NOT just "Graph Algorithms" or "Computer Science")
-- Topics: "Python Loops, While Loops, For Loops" → Title: "Loop Structures & Iteration" (NOT just "Loops" or "Computer Science")
-- Topics: "Memoization, Dynamic Programming, Recursion" → Title: "Dynamic Programming & Recursion" (NOT just "Dynamic Programming" or "Computer Science")
-- Topics: "Binary Search Tree, Balanced BST, Tree Traversal" → Title: "Binary Tree Structures & Traversal" (NOT just "Trees" or "Computer Science")
-- Topics: "Hash Tables, Hash Functions, Collision Resolution" → Title: "Hash Tables & Collision Handling" (NOT just "Hash Tables" or "Computer Science")
-- Topics: "Heap Sort, Priority Queue, Heap Operations" → Title: "Heap Data Structures & Sorting" (NOT just "Heaps" or "Computer Science")
-
-IMPORTANT: 
-- Use 3-6 words to be descriptive and specific
-- Include the main topic categories in the title
-- If multiple related topics → combine them (e.g., "Sorting & Searching Algorithms")
-- If topics are about complexity → use "Complexity Analysis" or "Algorithm Complexity"
-- If topics are about data structures → specify which ones (e.g., "Tree & Graph Structures")
-- DO NOT default to generic "Computer Science" or "Algorithms" - be specific!
-- Make titles distinguishable: "Sorting Algorithms" vs "Graph Algorithms" vs "Complexity Analysis"
-
-Return ONLY the title (3-6 words), nothing else. No quotes, no explanation, just the title."""
+            prompt = _TITLE_PROMPT_TEMPLATE.format(
+                topics=topics_str, subject_context=subject_context
+            )
 
             response = await self.generate_response(
                 prompt=prompt,
@@ -801,12 +1097,10 @@ Return ONLY the title (3-6 words), nothing else. No quotes, no explanation, just
                 max_tokens=50,  # Only need a short title
             )
 
-            # Clean up the response - remove quotes, extra whitespace, etc.
-            title = response.strip()
-            # Remove quotes if present
-            title = title.strip('"').strip("'").strip()
+            # Clean up the response - remove surrounding quotes and whitespace in one pass
+            title = response.strip(_TITLE_STRIP_CHARS)
             # Remove any trailing punctuation or explanation
-            title = re.split(r"[\.\n]", title)[0].strip()
+            title = _TITLE_SPLIT_RE.split(title)[0].strip()
             # Allow 3-6 words for descriptive titles
             words = title.split()
             if len(words) > 6:
@@ -823,77 +1117,14 @@ Return ONLY the title (3-6 words), nothing else. No quotes, no explanation, just
 
             if not title or len(title) < 2:
                 # Fallback: generate descriptive title from topics
-                if topics and len(topics) > 0:
-                    # Combine first 2-3 topics to create descriptive title
-                    topic_words = []
-                    for topic in topics[:3]:
-                        words = topic.split()
-                        # Take key words from each topic (avoid common words like "the", "of", etc.)
-                        key_words = [
-                            w
-                            for w in words
-                            if w.lower() not in ["the", "of", "and", "or", "a", "an"]
-                        ]
-                        if key_words:
-                            topic_words.extend(
-                                key_words[:2]
-                            )  # Take up to 2 words per topic
-
-                    if topic_words:
-                        # Create descriptive title from topic words (3-6 words)
-                        title = " ".join(topic_words[:6])
-                    else:
-                        # Last resort: use first topic
-                        title = topics[0]
-                else:
-                    title = "General Quiz"
-
+                title = _fallback_title(topics)
+            else:
+                # Only AI-generated titles are cached so a bad response is retried
+                _TITLE_CACHE[title_key] = title
             logger.info(f"Generated quiz title: '{title}' from topics: {topics[:5]}")
             return title
 
         except Exception as e:
             logger.error(f"Failed to generate quiz title: {str(e)}")
             # Fallback: create descriptive title from topics
-            if topics and len(topics) > 0:
-                # Combine first few topics to create a descriptive title
-                topic_parts = []
-                for topic in topics[:3]:
-                    words = topic.split()
-                    # Extract meaningful words (skip common words)
-                    meaningful = [
-                        w
-                        for w in words
-                        if w.lower()
-                        not in ["the", "of", "and", "or", "a", "an", "in", "on", "at"]
-                    ]
-                    if meaningful:
-                        topic_parts.extend(meaningful[:2])
-
-                if topic_parts:
-                    # Create 3-6 word descriptive title
-                    title = " ".join(topic_parts[:6])
-                    # Add "Algorithms" or "Structures" if not already present and it makes sense
-                    title_lower = title.lower()
-                    if (
-                        "algorithm" not in title_lower
-                        and "structure" not in title_lower
-                        and "complexity" not in title_lower
-                    ):
-                        # Check if topics suggest algorithms or structures
-                        all_topics_str = " ".join(topics[:3]).lower()
-                        if any(
-                            word in all_topics_str
-                            for word in ["sort", "search", "traversal", "dfs", "bfs"]
-                        ):
-                            title = f"{title} Algorithms"
-                        elif any(
-                            word in all_topics_str
-                            for word in ["tree", "graph", "list", "array", "heap"]
-                        ):
-                            title = f"{title} Structures"
-
-                    return title[:50]  # Limit to 50 chars
-                else:
-                    # Last resort: use first topic
-                    return topics[0]
-            return "General Quiz"
+            return _fallback_title(topics)
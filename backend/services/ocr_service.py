@@ -1,12 +1,28 @@
 import pytesseract
 from PIL import Image
+import asyncio
+import hashlib
 import io
+import os
 import pdf2image
-from typing import Union
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, Optional, Union
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Tesseract runs as a subprocess per page, so threads give real parallelism
+_OCR_WORKERS = os.cpu_count() or 4
+# Resolution OCR input is normalized to; more pixels only slow Tesseract down
+_OCR_DPI = 200
+_MAX_IMAGE_SIDE = 2500
+
+# On-disk cache of extracted text keyed by a hash of the uploaded bytes
+_OCR_CACHE_DIR = "./ocr_cache"
+_OCR_CACHE_MAX_FILES = 500
+
 class OCRService:
     """Service for extracting text from PDFs and images using Tesseract OCR"""
     
@@ -15,7 +31,10 @@ class OCRService:
         # On macOS: brew install tesseract
         # On Ubuntu: sudo apt-get install tesseract-ocr
         # On Windows: Download from https://github.com/UB-Mannheim/tesseract/wiki
-        pass
+        self._executor = ThreadPoolExecutor(
+            max_workers=_OCR_WORKERS, thread_name_prefix="ocr"
+        )
+        self._inflight: Dict[str, "asyncio.Future[str]"] = {}
     
     async def extract_text(self, file_content: bytes, filename: str) -> str:
         """
@@ -31,39 +50,99 @@ class OCRService:
         try:
             file_ext = filename.lower().split('.')[-1]
             
-            if file_ext == 'pdf':
-                return await self._extract_from_pdf(file_content)
-            elif file_ext in ['jpg', 'jpeg', 'png', 'gif', 'bmp']:
-                return await self._extract_from_image(file_content)
-            else:
+            if file_ext != 'pdf' and file_ext not in ['jpg', 'jpeg', 'png', 'gif', 'bmp']:
                 raise ValueError(f"Unsupported file type: {file_ext}")
+            
+            # Identical re-uploads are served from the cache; concurrent identical
+            # uploads share a single OCR run
+            key = hashlib.blake2b(file_content, digest_size=16).hexdigest()
+            cached = self._read_cached(key)
+            if cached is not None:
+                logger.info(f"OCR cache hit for {filename} ({len(cached)} characters)")
+                return cached
+            
+            task = self._inflight.get(key)
+            if task is None:
+                task = asyncio.ensure_future(self._extract_uncached(file_ext, file_content, key))
+                self._inflight[key] = task
+                task.add_done_callback(lambda _: self._inflight.pop(key, None))
+            return await asyncio.shield(task)
                 
         except Exception as e:
             logger.error(f"OCR extraction failed: {str(e)}")
             raise Exception(f"Failed to extract text from {filename}: {str(e)}")
     
+    async def _extract_uncached(self, file_ext: str, file_content: bytes, key: str) -> str:
+        """Run OCR for a file type and store non-empty results in the cache"""
+        if file_ext == 'pdf':
+            text = await self._extract_from_pdf(file_content)
+        else:
+            text = await self._extract_from_image(file_content)
+        if text.strip():
+            self._write_cached(key, text)
+        return text
+    
+    def _read_cached(self, key: str) -> Optional[str]:
+        """Cached OCR text for a content hash, refreshing its LRU position"""
+        path = os.path.join(_OCR_CACHE_DIR, f"{key}.txt")
+        try:
+            with open(path, encoding="utf-8") as f:
+                text = f.read()
+            os.utime(path)
+            return text
+        except OSError:
+            return None
+    
+    def _write_cached(self, key: str, text: str):
+        """Atomically store OCR text, evicting the least recently used entries"""
+        try:
+            os.makedirs(_OCR_CACHE_DIR, exist_ok=True)
+            path = os.path.join(_OCR_CACHE_DIR, f"{key}.txt")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+            
+            entries = [e for e in os.scandir(_OCR_CACHE_DIR) if e.name.endswith(".txt")]
+            if len(entries) > _OCR_CACHE_MAX_FILES:
+                entries.sort(key=lambda e: e.stat().st_mtime)
+                for entry in entries[:len(entries) - _OCR_CACHE_MAX_FILES]:
+                    os.remove(entry.path)
+        except OSError as e:
+            # Caching is best-effort
+            logger.warning(f"Failed to write OCR cache: {str(e)}")
+    
     async def _extract_from_pdf(self, pdf_content: bytes) -> str:
         """Extract text from PDF file"""
         try:
             logger.info(f"Converting PDF to images (size: {len(pdf_content)} bytes)")
-            # Convert PDF to images
-            images = pdf2image.convert_from_bytes(pdf_content)
-            logger.info(f"PDF converted to {len(images)} page(s)")
-            
-            # Extract text from each page
-            all_text = []
-            for i, image in enumerate(images):
-                logger.info(f"Extracting text from page {i+1}/{len(images)}")
-                try:
-                    text = pytesseract.image_to_string(image)
-                    logger.info(f"Page {i+1} extracted {len(text)} characters")
-                    if text.strip():
-                        all_text.append(text)
-                    else:
-                        logger.warning(f"Page {i+1} extracted empty text")
-                except Exception as page_error:
-                    logger.error(f"Failed to extract text from page {i+1}: {str(page_error)}")
-                    # Continue with other pages
+            loop = asyncio.get_running_loop()
+            # Rasterize pages to files instead of holding every page image in memory;
+            # each page is opened only while it is being OCRed, so at most one image
+            # per worker is resident. Off the event loop, rasterizing pages in parallel.
+            # Grayscale at 200 DPI is all Tesseract needs and a third of the pixels of RGB
+            with tempfile.TemporaryDirectory(prefix="ocr_pages_") as pages_dir:
+                paths = await loop.run_in_executor(
+                    self._executor,
+                    partial(
+                        pdf2image.convert_from_bytes,
+                        pdf_content,
+                        dpi=_OCR_DPI,
+                        grayscale=True,
+                        thread_count=_OCR_WORKERS,
+                        output_folder=pages_dir,
+                        fmt="png",
+                        paths_only=True,
+                    )
+                )
+                logger.info(f"PDF converted to {len(paths)} page(s)")
+                
+                # Extract text from all pages concurrently, keeping page order
+                texts = await asyncio.gather(*(
+                    loop.run_in_executor(self._executor, self._ocr_page, i, len(paths), path)
+                    for i, path in enumerate(paths)
+                ))
+            all_text = [text for text in texts if text.strip()]
             
             result = "\n\n".join(all_text)
             logger.info(f"Total extracted text: {len(result)} characters")
@@ -75,6 +154,21 @@ class OCRService:
             logger.error(f"PDF extraction failed: {str(e)}", exc_info=True)
             raise Exception(f"Failed to extract text from PDF: {str(e)}")
     
+    def _ocr_page(self, index: int, total: int, path: str) -> str:
+        """OCR a single rasterized PDF page (runs in the executor); returns "" on failure"""
+        logger.info(f"Extracting text from page {index+1}/{total}")
+        try:
+            with Image.open(path) as image:
+                text = pytesseract.image_to_string(image)
+            logger.info(f"Page {index+1} extracted {len(text)} characters")
+            if not text.strip():
+                logger.warning(f"Page {index+1} extracted empty text")
+            return text
+        except Exception as page_error:
+            logger.error(f"Failed to extract text from page {index+1}: {str(page_error)}")
+            # Continue with other pages
+            return ""
+    
     async def _extract_from_image(self, image_content: bytes) -> str:
         """Extract text from image file"""
         try:
@@ -83,8 +177,16 @@ class OCRService:
             image = Image.open(io.BytesIO(image_content))
             logger.info(f"Image opened: {image.size}, mode: {image.mode}")
             
+            # Tesseract runtime scales with pixel count: drop color and oversized scans
+            if image.mode != "L":
+                image = image.convert("L")
+            if max(image.size) > _MAX_IMAGE_SIDE:
+                image.thumbnail((_MAX_IMAGE_SIDE, _MAX_IMAGE_SIDE), Image.LANCZOS)
+            
             # Extract text using Tesseract
-            text = pytesseract.image_to_string(image)
+            text = await asyncio.get_running_loop().run_in_executor(
+                self._executor, pytesseract.image_to_string, image
+            )
             logger.info(f"Extracted {len(text)} characters from image")
             
             if not text.strip():
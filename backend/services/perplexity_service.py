@@ -7,6 +7,14 @@ from dotenv import load_dotenv
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Closing instructions shared by every personalized query
+_FREE_RESOURCES_SUFFIX = (
+    "Include: tutorials, practice problems, video explanations, and written guides. "
+    "IMPORTANT: Only return resources that are completely free to access, no paywalls, no subscriptions required. "
+    "Include free videos (YouTube, educational platforms), free articles, free research papers, open-access journals, free tutorials, and free practice problems. "
+    "Exclude any resources that require payment, subscription, or registration fees."
+)
+
 
 class PerplexityService:
     """Service for searching study materials using Perplexity API"""
@@ -69,16 +77,9 @@ class PerplexityService:
 
     def _extract_description(self, result) -> str:
         """Extract description from Perplexity result"""
-        try:
-            # Try to get snippet or content
-            if hasattr(result, "snippet") and result.snippet:
-                return result.snippet[:200]  # Limit to 200 chars
-            elif hasattr(result, "content") and result.content:
-                return result.content[:200]
-            else:
-                return "Study material from Perplexity search"
-        except:
-            return "Study material from Perplexity search"
+        # Try to get snippet or content
+        desc = getattr(result, "snippet", None) or getattr(result, "content", None)
+        return desc[:200] if desc else "Study material from Perplexity search"
 
     async def build_personalized_query(
         self,
@@ -115,14 +116,7 @@ class PerplexityService:
         if context:
             query_parts.append(f"Context: {context}")
 
-        # Add material type preferences
-        query_parts.append(
-            "Include: tutorials, practice problems, video explanations, and written guides"
-        )
-
-        # CRITICAL: Only return free, accessible resources
-        query_parts.append(
-            "IMPORTANT: Only return resources that are completely free to access, no paywalls, no subscriptions required. Include free videos (YouTube, educational platforms), free articles, free research papers, open-access journals, free tutorials, and free practice problems. Exclude any resources that require payment, subscription, or registration fees."
-        )
+        # Add material type preferences; only free, accessible resources (critical)
+        query_parts.append(_FREE_RESOURCES_SUFFIX)
 
         return ". ".join(query_parts)
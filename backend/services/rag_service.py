@@ -1,13 +1,42 @@
 import chromadb
 from chromadb.config import Settings
+import asyncio
+import hashlib
 import os
 import logging
-from typing import List, Dict, Any, Optional
-import json
+import uuid
+from collections import defaultdict, deque
+from typing import List, Dict, Any, Optional, Tuple, DefaultDict, Deque
+import orjson
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Queued weakness documents are added together once this many are waiting,
+# or after this many seconds
+_WRITE_BATCH_SIZE = 32
+_WRITE_FLUSH_DELAY = 0.5
+# How many recent document hashes are remembered per user for dedupe
+_RECENT_DOCS_PER_USER = 64
+
+# ChromaDB metadata values must be scalars, so topic lists are stored joined
+# with a separator that does not occur in topic names
+_TOPIC_SEP = "\x1f"
+
+
+def _dumps(obj: Any) -> str:
+    """Serialize to a JSON str (orjson returns bytes; ChromaDB wants str)"""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+def _split_topics(value: str) -> List[str]:
+    """Topic names from a metadata "topics" value"""
+    # Documents written before topics were separator-joined stored a JSON list
+    if value.startswith("["):
+        return orjson.loads(value)
+    return [topic for topic in value.split(_TOPIC_SEP) if topic]
+
+
 class RAGService:
     """Service for RAG (Retrieval Augmented Generation) using ChromaDB vector database"""
     
@@ -25,6 +54,14 @@ class RAGService:
             self.collection = self.client.get_collection(name=self.collection_name)
         except:
             self.collection = self.client.create_collection(name=self.collection_name)
+        
+        # Writes waiting for the next batched add: (id, document, metadata, document hash)
+        self._pending: List[Tuple[str, str, Dict[str, Any], bytes]] = []
+        self._flush_task: Optional["asyncio.Future[None]"] = None
+        # Hashes of the last few documents written per user, to skip identical rewrites
+        self._recent_doc_hashes: DefaultDict[str, Deque[bytes]] = defaultdict(
+            lambda: deque(maxlen=_RECENT_DOCS_PER_USER)
+        )
     
     async def store_user_weakness(
         self,
@@ -46,25 +83,35 @@ class RAGService:
             # Create document text
             doc_text = f"User {user_id} struggles with topics: {', '.join(topics)}. "
             if error_details:
-                doc_text += f"Error details: {json.dumps(error_details)}. "
+                doc_text += f"Error details: {_dumps(error_details)}. "
             doc_text += f"Context: {context[:500]}"  # Limit context length
             
+            # Skip re-embedding a document this user was just given, or that is
+            # already queued (a queued document is retried until it is written)
+            doc_hash = hashlib.blake2b(doc_text.encode(), digest_size=8).digest()
+            if doc_hash in self._recent_doc_hashes[user_id] or any(
+                entry[2]["user_id"] == user_id and entry[3] == doc_hash
+                for entry in self._pending
+            ):
+                logger.info(f"Skipped duplicate weakness data for user {user_id}")
+                return
+            
             # Create metadata
             metadata = {
                 "user_id": user_id,
-                "topics": json.dumps(topics),
+                "topics": _TOPIC_SEP.join(topics),
                 "timestamp": datetime.now().isoformat()
             }
             
-            # Generate unique ID
-            doc_id = f"{user_id}_{len(self.collection.get()['ids'])}"
+            # Generate unique ID (without fetching the whole collection to count it)
+            doc_id = f"{user_id}_{uuid.uuid4().hex}"
             
-            # Add to collection
-            self.collection.add(
-                documents=[doc_text],
-                metadatas=[metadata],
-                ids=[doc_id]
-            )
+            # Queue for a batched add: one embedding pass covers many documents
+            self._pending.append((doc_id, doc_text, metadata, doc_hash))
+            if len(self._pending) >= _WRITE_BATCH_SIZE:
+                await self.flush()
+            elif self._flush_task is None:
+                self._flush_task = asyncio.ensure_future(self._flush_later())
             
             logger.info(f"Stored weakness data for user {user_id}")
             
@@ -72,6 +119,49 @@ class RAGService:
             logger.error(f"Failed to store user weakness: {str(e)}")
             raise
     
+    async def flush(self):
+        """Write all queued documents to the collection in a single add()
+        
+        Raises if the add fails; the documents then stay queued for the next flush.
+        """
+        if not self._pending:
+            return
+        # Swap the buffer before awaiting so writes queued meanwhile start a new batch
+        batch, self._pending = self._pending, []
+        ids, documents, metadatas, doc_hashes = (list(column) for column in zip(*batch))
+        try:
+            await asyncio.to_thread(
+                self.collection.add,
+                documents=documents,
+                metadatas=metadatas,
+                ids=ids
+            )
+        except Exception:
+            # Put the batch back ahead of anything queued meanwhile so it is retried
+            # by the next flush instead of being dropped
+            self._pending[:0] = batch
+            raise
+        # Only written documents count as recent, so a failed write isn't deduped away
+        for metadata, doc_hash in zip(metadatas, doc_hashes):
+            self._recent_doc_hashes[metadata["user_id"]].append(doc_hash)
+        logger.info(f"Flushed {len(ids)} weakness document(s) to the vector database")
+    
+    async def _flush_later(self):
+        """Flush queued writes after a short delay so nearby writes share a batch"""
+        await asyncio.sleep(_WRITE_FLUSH_DELAY)
+        self._flush_task = None
+        await self._try_flush()
+    
+    async def _try_flush(self):
+        """Flush, logging a failure instead of raising; failed documents stay queued"""
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(
+                f"Failed to flush user weakness data, {len(self._pending)} document(s) "
+                f"kept queued for the next flush: {str(e)}"
+            )
+    
     async def get_user_weaknesses(self, user_id: str) -> Dict[str, Any]:
         """
         Retrieve user weaknesses from vector database
@@ -83,10 +173,18 @@ class RAGService:
             Dictionary with topics and related information
         """
         try:
+            # Make queued writes visible to this read; a failed write stays
+            # queued and shouldn't fail the read
+            await self._try_flush()
+            
             # Query collection for user's data
-            results = self.collection.get(
+            # Run the blocking ChromaDB read off the event loop; only the topic
+            # metadata is used, so skip transferring the document bodies
+            results = await asyncio.to_thread(
+                self.collection.get,
                 where={"user_id": user_id},
-                limit=10
+                limit=10,
+                include=["metadatas"]
             )
             
             if not results['ids']:
@@ -96,13 +194,11 @@ class RAGService:
             all_topics = set()
             for metadata in results['metadatas']:
                 if 'topics' in metadata:
-                    topics = json.loads(metadata['topics'])
-                    all_topics.update(topics)
+                    all_topics.update(_split_topics(metadata['topics']))
             
             return {
                 "topics": list(all_topics),
-                "count": len(all_topics),
-                "documents": results['documents']
+                "count": len(all_topics)
             }
             
         except Exception as e:
@@ -125,7 +221,7 @@ class RAGService:
         """
         try:
             # Store updated weakness data
-            context = f"Quiz performance: {json.dumps(performance_data) if performance_data else 'N/A'}"
+            context = f"Quiz performance: {_dumps(performance_data) if performance_data else 'N/A'}"
             await self.store_user_weakness(
                 user_id=user_id,
                 topics=topics,
@@ -154,6 +250,10 @@ class RAGService:
             List of similar documents
         """
         try:
+            # Make queued writes visible to this read; a failed write stays
+            # queued and shouldn't fail the read
+            await self._try_flush()
+            
             where_clause = {"user_id": user_id} if user_id else None
             
             results = self.collection.query(
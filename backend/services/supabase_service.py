@@ -1,13 +1,79 @@
 from supabase import create_client, Client
+import asyncio
+import hashlib
 import os
 import logging
 from typing import List, Dict, Any, Optional
-from datetime import datetime, timezone
+from datetime import datetime
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Normalized correctness values -> midterm stats bucket
+_CORRECTNESS_BUCKETS = {
+    "correct": "correct",
+    "incorrect": "wrong",
+    "partially_correct": "partial",
+    "partially correct": "partial",
+    "partial": "partial",
+}
+
+class _ClientCache(TTLCache):
+    """TTLCache that closes the PostgREST HTTP session of clients it drops"""
+
+    @staticmethod
+    def _close(client: Client) -> None:
+        try:
+            client.postgrest.session.close()
+        except Exception as e:
+            logger.warning(f"Error closing evicted Supabase client: {e}")
+
+    def popitem(self):
+        key, client = super().popitem()
+        self._close(client)
+        return key, client
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for _, client in expired:
+            self._close(client)
+        return expired
+
+
+# Per-user-token clients, so repeat saves skip client construction. Entries expire
+# with the access tokens they carry (Supabase JWTs default to a one hour lifetime)
+_TOKEN_CLIENTS: TTLCache = _ClientCache(maxsize=256, ttl=3600)
+
+# Rows fetched by ID (quizzes, midterm analyses, quiz results), keyed by
+# (table, id[, user_id]). They rarely change after creation, and the one
+# in-place update (quiz summaries) calls forget_quiz_result
+_READ_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=300)
+
+# Columns returned by the per-user list queries: everything the list views use,
+# leaving out the large blobs (quiz questions, midterm OCR text)
+_QUIZ_LIST_COLUMNS = "id,user_id,title,topics,created_at"
+_MIDTERM_LIST_COLUMNS = (
+    "id,user_id,filename,course_name,errors,recommended_resources,error_topics,"
+    "total_errors,correct_count,wrong_count,partially_correct_count,"
+    "total_marks_received,total_marks_possible,created_at"
+)
+
+
+def _client_for_token(auth_token: str) -> Client:
+    """Supabase client authorized with a user's JWT, reused across calls with the same token"""
+    key = hashlib.sha256(auth_token.encode()).digest()
+    client = _TOKEN_CLIENTS.get(key)
+    if client is None:
+        client = create_client(os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY"))
+        # supabase-py 2.0 requires ClientOptions (not a dict) and overwrites the
+        # Authorization header with the API key, so set the user's JWT on PostgREST
+        client.postgrest.auth(auth_token)
+        _TOKEN_CLIENTS[key] = client
+    return client
+
+
 class SupabaseService:
     """Service for interacting with Supabase database"""
     
@@ -17,7 +83,13 @@ class SupabaseService:
         # Use service role key if available (bypasses RLS), otherwise use anon key
         supabase_key = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_KEY", "YOUR_SUPABASE_KEY_HERE")
         
+        # supabase-py is synchronous: every execute() goes through asyncio.to_thread
+        # so network waits don't block the event loop
         self.client: Client = create_client(supabase_url, supabase_key)
+        # Cleared if the get_latest_activity function hasn't been created in the database
+        self._latest_activity_rpc = True
+        # Cleared if the save_midterm_with_resources function hasn't been created
+        self._save_midterm_rpc = True
         
         if os.getenv("SUPABASE_SERVICE_ROLE_KEY"):
             logger.info("Using Supabase service role key (RLS bypassed)")
@@ -58,23 +130,29 @@ class SupabaseService:
             total_errors = len(errors)  # Only count errors (for display)
             total_questions = len(questions_for_stats)  # Total questions including correct ones
             
-            # Normalize correctness values for comparison (handle case variations)
-            correct_count = sum(1 for e in questions_for_stats if str(e.get("correctness", "")).lower().strip() == "correct")
-            wrong_count = sum(1 for e in questions_for_stats if str(e.get("correctness", "")).lower().strip() == "incorrect")
-            partially_correct_count = sum(1 for e in questions_for_stats if str(e.get("correctness", "")).lower().strip() in ["partially_correct", "partially correct", "partial"])
+            # Count outcomes and total the marks in one pass over the questions,
+            # normalizing each correctness value once (handles case variations).
+            # Marks start as ints so integer-only marks stay ints for the INTEGER columns
+            correct_count = wrong_count = partially_correct_count = 0
+            total_marks_received = total_marks_possible = 0
+            for e in questions_for_stats:
+                correctness = e.get("correctness")
+                bucket = _CORRECTNESS_BUCKETS.get(correctness.strip().lower()) if isinstance(correctness, str) else None
+                if bucket == "correct":
+                    correct_count += 1
+                elif bucket == "wrong":
+                    wrong_count += 1
+                elif bucket == "partial":
+                    partially_correct_count += 1
+                marks_received = e.get("marksReceived")
+                if isinstance(marks_received, (int, float)):
+                    total_marks_received += marks_received
+                marks_possible = e.get("totalMarks")
+                if isinstance(marks_possible, (int, float)):
+                    total_marks_possible += marks_possible
             
             logger.info(f"Midterm stats calculated: total_questions={total_questions}, total_errors={total_errors}, correct={correct_count}, wrong={wrong_count}, partial={partially_correct_count}")
             
-            # Calculate total marks - handle None values properly (from all questions for accuracy)
-            total_marks_received = sum(
-                (e.get("marksReceived") or 0) if isinstance(e.get("marksReceived"), (int, float)) else 0
-                for e in questions_for_stats
-            )
-            total_marks_possible = sum(
-                (e.get("totalMarks") or 0) if isinstance(e.get("totalMarks"), (int, float)) else 0
-                for e in questions_for_stats
-            )
-            
             data = {
                 "user_id": user_id,  # This should be auth.users.id UUID
                 "filename": filename,
@@ -88,11 +166,32 @@ class SupabaseService:
                 "wrong_count": wrong_count,
                 "partially_correct_count": partially_correct_count,
                 "total_marks_received": total_marks_received if total_marks_received > 0 else None,
-                "total_marks_possible": total_marks_possible if total_marks_possible > 0 else None,
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "total_marks_possible": total_marks_possible if total_marks_possible > 0 else None
             }
             
-            result = self.client.table("midterm_analyses").insert(data).execute()
+            if self._save_midterm_rpc:
+                # One round trip and one transaction for the analysis and its resources
+                # (sql_schema/create_save_midterm_function.sql)
+                params = {
+                    "p_analysis": data,
+                    "p_resources": recommended_resources if recommended_resources and error_topics else [],
+                    "p_topics": error_topics or []
+                }
+                try:
+                    result = await asyncio.to_thread(
+                        self.client.rpc("save_midterm_with_resources", params).execute
+                    )
+                    if result.data:
+                        return result.data
+                    raise Exception("Failed to save midterm analysis")
+                except Exception as e:
+                    # PGRST202: function not created in this database - use the table inserts
+                    if getattr(e, "code", None) != "PGRST202":
+                        raise
+                    logger.warning(f"save_midterm_with_resources RPC unavailable, inserting directly: {str(e)}")
+                    self._save_midterm_rpc = False
+            
+            result = await asyncio.to_thread(self.client.table("midterm_analyses").insert(data).execute)
             
             if result.data:
                 analysis_id = result.data[0]["id"]
@@ -139,24 +238,21 @@ class SupabaseService:
                 "user_id": user_id,
                 "title": title,
                 "questions": questions,
-                "topics": topics or [],
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "topics": topics or []
             }
             
-            # If we have auth token, create a new client with it
+            # If we have auth token, use a client authorized with it
             if auth_token:
-                from supabase import create_client
-                client = create_client(
-                    os.getenv("SUPABASE_URL"),
-                    os.getenv("SUPABASE_KEY"),
-                    options={"headers": {"Authorization": f"Bearer {auth_token}"}}
-                )
-                result = client.table("quizzes").insert(data).execute()
+                client = _client_for_token(auth_token)
+                result = await asyncio.to_thread(client.table("quizzes").insert(data).execute)
             else:
-                result = self.client.table("quizzes").insert(data).execute()
+                result = await asyncio.to_thread(self.client.table("quizzes").insert(data).execute)
             
             if result.data:
-                return result.data[0]["id"]
+                quiz = result.data[0]
+                # Quizzes don't change after creation, so the inserted row can serve reads
+                _READ_CACHE[("quizzes", quiz["id"])] = quiz
+                return quiz["id"]
             else:
                 raise Exception("Failed to save quiz")
                 
@@ -167,9 +263,15 @@ class SupabaseService:
     async def get_quiz(self, quiz_id: str) -> Dict[str, Any]:
         """Get quiz by ID"""
         try:
-            result = self.client.table("quizzes").select("*").eq("id", quiz_id).execute()
+            key = ("quizzes", quiz_id)
+            cached = _READ_CACHE.get(key)
+            if cached is not None:
+                return cached
+            
+            result = await asyncio.to_thread(self.client.table("quizzes").select("*").eq("id", quiz_id).execute)
             
             if result.data:
+                _READ_CACHE[key] = result.data[0]
                 return result.data[0]
             else:
                 raise Exception("Quiz not found")
@@ -178,10 +280,10 @@ class SupabaseService:
             logger.error(f"Failed to get quiz: {str(e)}")
             raise
     
-    async def get_user_quizzes(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get all quizzes for a user"""
+    async def get_user_quizzes(self, user_id: str, columns: str = _QUIZ_LIST_COLUMNS) -> List[Dict[str, Any]]:
+        """Get all quizzes for a user (without questions - use get_quiz for those)"""
         try:
-            result = self.client.table("quizzes").select("*").eq("user_id", user_id).execute()
+            result = await asyncio.to_thread(self.client.table("quizzes").select(columns).eq("user_id", user_id).execute)
             
             return result.data or []
                 
@@ -197,18 +299,23 @@ class SupabaseService:
     ):
         """Save recommended resources to Supabase"""
         try:
-            for material in materials:
-                data = {
+            if not materials:
+                return
+            
+            # One insert for all rows instead of a round trip per material
+            rows = [
+                {
                     "user_id": user_id,
                     "title": material["title"],
                     "description": material["description"],
                     "url": material["url"],
                     "topics": topics,
-                    "source": material.get("source", "Perplexity"),
-                    "created_at": datetime.now(timezone.utc).isoformat()
+                    "source": material.get("source", "Perplexity")
                 }
-                
-                self.client.table("recommended_resources").insert(data).execute()
+                for material in materials
+            ]
+            
+            await asyncio.to_thread(self.client.table("recommended_resources").insert(rows).execute)
                 
         except Exception as e:
             logger.error(f"Failed to save recommended resources: {str(e)}")
@@ -237,8 +344,7 @@ class SupabaseService:
                 "quiz_id": quiz_id,
                 "score": score,
                 "answers": answers,
-                "weak_topics": weak_topics,
-                "completed_at": datetime.now(timezone.utc).isoformat()
+                "weak_topics": weak_topics
             }
             
             # Add optional fields if provided
@@ -259,7 +365,7 @@ class SupabaseService:
             if recommended_resources:
                 data["recommended_resources"] = recommended_resources  # JSONB array
             
-            result = self.client.table("quiz_results").insert(data).execute()
+            result = await asyncio.to_thread(self.client.table("quiz_results").insert(data).execute)
             logger.info(f"Quiz result saved: quiz_id={quiz_id}, score={score}, correct={correct_count}/{total_questions}")
             return result.data[0]["id"] if result.data else None
                 
@@ -267,19 +373,42 @@ class SupabaseService:
             logger.error(f"Failed to save quiz result: {str(e)}")
             raise
     
-    async def get_user_quiz_results(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get all quiz results for a user"""
+    async def get_user_quiz_results(
+        self,
+        user_id: str,
+        columns: str = "*",
+        offset: int = 0,
+        limit: Optional[int] = 50
+    ) -> List[Dict[str, Any]]:
+        """Get one page of a user's quiz results, newest first (limit=None for all of them)"""
         try:
-            result = self.client.table("quiz_results").select("*").eq("user_id", user_id).order("completed_at", desc=True).execute()
+            # Run the blocking HTTP call off the event loop so reads can overlap
+            query = self.client.table("quiz_results").select(columns).eq("user_id", user_id).order("completed_at", desc=True)
+            if limit is not None:
+                # Served in index order by idx_quiz_results_user_completed
+                query = query.range(offset, offset + limit - 1)
+            result = await asyncio.to_thread(query.execute)
             return result.data or []
         except Exception as e:
             logger.error(f"Failed to get quiz results: {str(e)}")
             return []
     
-    async def get_user_midterm_analyses(self, user_id: str) -> List[Dict[str, Any]]:
-        """Get all midterm analyses for a user"""
+    async def get_user_midterm_analyses(
+        self,
+        user_id: str,
+        columns: str = _MIDTERM_LIST_COLUMNS,
+        offset: int = 0,
+        limit: Optional[int] = 50
+    ) -> List[Dict[str, Any]]:
+        """Get one page of a user's midterm analyses, newest first (limit=None for all of them),
+        without extracted_text (use get_midterm_analysis for it)"""
         try:
-            result = self.client.table("midterm_analyses").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
+            # Run the blocking HTTP call off the event loop so reads can overlap
+            query = self.client.table("midterm_analyses").select(columns).eq("user_id", user_id).order("created_at", desc=True)
+            if limit is not None:
+                # Served in index order by idx_midterm_analyses_user_created
+                query = query.range(offset, offset + limit - 1)
+            result = await asyncio.to_thread(query.execute)
             return result.data or []
         except Exception as e:
             logger.error(f"Failed to get midterm analyses: {str(e)}")
@@ -288,30 +417,51 @@ class SupabaseService:
     async def get_latest_activity_timestamp(self, user_id: str) -> Optional[str]:
         """Get the latest activity timestamp from quiz_results or midterm_analyses"""
         try:
-            # Get latest quiz result timestamp
-            quiz_result = self.client.table("quiz_results").select("completed_at").eq("user_id", user_id).order("completed_at", desc=True).limit(1).execute()
-            latest_quiz = quiz_result.data[0].get("completed_at") if quiz_result.data else None
-            
-            # Get latest midterm analysis timestamp
-            midterm_result = self.client.table("midterm_analyses").select("created_at").eq("user_id", user_id).order("created_at", desc=True).limit(1).execute()
-            latest_midterm = midterm_result.data[0].get("created_at") if midterm_result.data else None
+            if self._latest_activity_rpc:
+                # One round trip: the database takes the max over both tables
+                # (sql_schema/create_latest_activity_function.sql)
+                try:
+                    result = await asyncio.to_thread(
+                        self.client.rpc("get_latest_activity", {"uid": user_id}).execute
+                    )
+                    return result.data or None
+                except Exception as e:
+                    logger.warning(f"get_latest_activity RPC failed, querying tables directly: {str(e)}")
+                    # PGRST202: function not created in this database - stop trying it
+                    if getattr(e, "code", None) == "PGRST202":
+                        self._latest_activity_rpc = False
             
-            # Return the most recent timestamp
-            if latest_quiz and latest_midterm:
-                return max(latest_quiz, latest_midterm)
-            elif latest_quiz:
-                return latest_quiz
-            elif latest_midterm:
-                return latest_midterm
-            return None
+            return await self._latest_activity_from_tables(user_id)
         except Exception as e:
             logger.error(f"Failed to get latest activity timestamp: {str(e)}")
             return None
     
+    async def _latest_activity_from_tables(self, user_id: str) -> Optional[str]:
+        """Latest activity timestamp without the get_latest_activity RPC"""
+        # Latest quiz result and midterm analysis timestamps are independent,
+        # so fetch them concurrently off the event loop
+        quiz_query = self.client.table("quiz_results").select("completed_at").eq("user_id", user_id).order("completed_at", desc=True).limit(1)
+        midterm_query = self.client.table("midterm_analyses").select("created_at").eq("user_id", user_id).order("created_at", desc=True).limit(1)
+        quiz_result, midterm_result = await asyncio.gather(
+            asyncio.to_thread(quiz_query.execute),
+            asyncio.to_thread(midterm_query.execute)
+        )
+        latest_quiz = quiz_result.data[0].get("completed_at") if quiz_result.data else None
+        latest_midterm = midterm_result.data[0].get("created_at") if midterm_result.data else None
+        
+        # Return the most recent timestamp
+        if latest_quiz and latest_midterm:
+            return max(latest_quiz, latest_midterm)
+        elif latest_quiz:
+            return latest_quiz
+        elif latest_midterm:
+            return latest_midterm
+        return None
+    
     async def get_cached_resources(self, user_id: str) -> Optional[Dict[str, Any]]:
         """Get cached resources for a user"""
         try:
-            result = self.client.table("user_resources_cache").select("*").eq("user_id", user_id).limit(1).execute()
+            result = await asyncio.to_thread(self.client.table("user_resources_cache").select("*").eq("user_id", user_id).limit(1).execute)
             if result.data:
                 cache_data = result.data[0]
                 return {
@@ -341,14 +491,8 @@ class SupabaseService:
                 "data_timestamp": data_timestamp  # Store the timestamp of the data used
             }
             
-            # Try to update existing cache, or insert if doesn't exist
-            existing = self.client.table("user_resources_cache").select("id").eq("user_id", user_id).limit(1).execute()
-            if existing.data:
-                # Update existing
-                self.client.table("user_resources_cache").update(cache_data).eq("user_id", user_id).execute()
-            else:
-                # Insert new
-                self.client.table("user_resources_cache").insert(cache_data).execute()
+            # Insert, or update the user's existing cache row (user_id is UNIQUE), in one request
+            await asyncio.to_thread(self.client.table("user_resources_cache").upsert(cache_data, on_conflict="user_id").execute)
         except Exception as e:
             # Table might not exist, log but don't fail
             logger.warning(f"Failed to save resources cache (table may not exist): {str(e)}")
@@ -356,8 +500,14 @@ class SupabaseService:
     async def get_midterm_analysis(self, analysis_id: str, user_id: str) -> Dict[str, Any]:
         """Get a specific midterm analysis by ID"""
         try:
-            result = self.client.table("midterm_analyses").select("*").eq("id", analysis_id).eq("user_id", user_id).execute()
+            key = ("midterm_analyses", analysis_id, user_id)
+            cached = _READ_CACHE.get(key)
+            if cached is not None:
+                return cached
+            
+            result = await asyncio.to_thread(self.client.table("midterm_analyses").select("*").eq("id", analysis_id).eq("user_id", user_id).execute)
             if result.data:
+                _READ_CACHE[key] = result.data[0]
                 return result.data[0]
             else:
                 raise Exception("Midterm analysis not found")
@@ -368,8 +518,14 @@ class SupabaseService:
     async def get_quiz_result_by_id(self, result_id: str, user_id: str) -> Dict[str, Any]:
         """Get a specific quiz result by result ID"""
         try:
-            result = self.client.table("quiz_results").select("*").eq("id", result_id).eq("user_id", user_id).execute()
+            key = ("quiz_results", result_id, user_id)
+            cached = _READ_CACHE.get(key)
+            if cached is not None:
+                return cached
+            
+            result = await asyncio.to_thread(self.client.table("quiz_results").select("*").eq("id", result_id).eq("user_id", user_id).execute)
             if result.data:
+                _READ_CACHE[key] = result.data[0]
                 return result.data[0]
             else:
                 raise Exception("Quiz result not found")
@@ -377,6 +533,10 @@ class SupabaseService:
             logger.error(f"Failed to get quiz result: {str(e)}")
             raise
     
+    def forget_quiz_result(self, result_id: str, user_id: str):
+        """Drop a cached quiz result after it has been updated"""
+        _READ_CACHE.pop(("quiz_results", result_id, user_id), None)
+    
     async def save_uploaded_material(
         self,
         user_id: str,
@@ -395,15 +555,14 @@ class SupabaseService:
                 "file_type": file_type,
                 "file_size": file_size,
                 "extracted_text": extracted_text,
-                "topics": topics,
-                "created_at": datetime.now(timezone.utc).isoformat()
+                "topics": topics
             }
             
             # Add subject if provided (column may not exist in older schemas)
             if subject:
                 data["subject"] = subject
             
-            self.client.table("uploaded_materials").insert(data).execute()
+            await asyncio.to_thread(self.client.table("uploaded_materials").insert(data).execute)
         except Exception as e:
             logger.error(f"Failed to save uploaded material: {str(e)}")
             # Don't raise - not critical
@@ -0,0 +1,76 @@
+"""
+Tests for RAGService's batched weakness writes
+Run from the backend directory: python -m unittest test_rag_service
+"""
+
+import unittest
+from unittest import mock
+
+from services.rag_service import RAGService
+
+
+class FailingOnceCollection:
+    """Stand-in ChromaDB collection whose first add() fails"""
+
+    def __init__(self):
+        self.calls = 0
+        self.added_ids = []
+
+    def add(self, documents, metadatas, ids):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError("vector database unavailable")
+        self.added_ids.extend(ids)
+
+
+class TestWeaknessWriteBuffer(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        # Keep the test from opening ./chroma_db
+        with mock.patch("services.rag_service.chromadb.PersistentClient"):
+            self.rag = RAGService()
+        self.collection = FailingOnceCollection()
+        self.rag.collection = self.collection
+
+    async def test_failed_flush_keeps_batch_queued(self):
+        await self.rag.store_user_weakness("user-1", ["Recursion"], "quiz")
+        await self.rag.store_user_weakness("user-2", ["Graphs"], "quiz")
+        queued_ids = [entry[0] for entry in self.rag._pending]
+
+        with self.assertRaises(RuntimeError):
+            await self.rag.flush()
+        self.assertEqual([entry[0] for entry in self.rag._pending], queued_ids)
+
+        await self.rag.flush()
+        self.assertEqual(self.collection.added_ids, queued_ids)
+        self.assertEqual(self.rag._pending, [])
+
+    async def test_timer_flush_failure_is_retried(self):
+        await self.rag.store_user_weakness("user-1", ["Recursion"], "quiz")
+        queued_ids = [entry[0] for entry in self.rag._pending]
+
+        # The deferred flush logs the failure instead of dropping the batch
+        await self.rag._flush_task
+        self.assertEqual([entry[0] for entry in self.rag._pending], queued_ids)
+
+        await self.rag.flush()
+        self.assertEqual(self.collection.added_ids, queued_ids)
+
+
+    async def test_duplicate_counts_only_after_write(self):
+        await self.rag.store_user_weakness("user-1", ["Recursion"], "quiz")
+        with self.assertRaises(RuntimeError):
+            await self.rag.flush()
+        self.assertEqual(len(self.rag._recent_doc_hashes["user-1"]), 0)
+
+        # Still queued after the failure, so a retry isn't queued a second time
+        await self.rag.store_user_weakness("user-1", ["Recursion"], "quiz")
+        self.assertEqual(len(self.rag._pending), 1)
+
+        await self.rag.flush()
+        self.assertEqual(len(self.collection.added_ids), 1)
+        await self.rag.store_user_weakness("user-1", ["Recursion"], "quiz")
+        self.assertEqual(self.rag._pending, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
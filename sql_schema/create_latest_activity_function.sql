@@ -0,0 +1,21 @@
+-- Latest activity (quiz result or midterm analysis) for a user in a single round trip.
+-- Used by the backend to decide whether cached resources are still fresh.
+CREATE OR REPLACE FUNCTION get_latest_activity(uid UUID)
+RETURNS TIMESTAMPTZ
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT GREATEST(
+        (SELECT MAX(completed_at) FROM quiz_results WHERE user_id = uid),
+        (SELECT MAX(created_at) FROM midterm_analyses WHERE user_id = uid)
+    );
+$$;
+
+GRANT EXECUTE ON FUNCTION get_latest_activity(UUID) TO authenticated, service_role;
+
+-- Composite indexes so each MAX() (and the per-user ORDER BY ... DESC list queries)
+-- is answered from the index without a sort
+CREATE INDEX IF NOT EXISTS idx_quiz_results_user_completed ON quiz_results(user_id, completed_at DESC);
+CREATE INDEX IF NOT EXISTS idx_midterm_analyses_user_created ON midterm_analyses(user_id, created_at DESC);
+
+COMMENT ON FUNCTION get_latest_activity(UUID) IS 'Most recent quiz_results.completed_at or midterm_analyses.created_at for a user';
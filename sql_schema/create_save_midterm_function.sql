@@ -0,0 +1,43 @@
+-- Save a midterm analysis and its recommended resources in one transaction (one round trip).
+-- p_analysis: midterm_analyses row as JSON (without id/created_at, which use their defaults)
+-- p_resources: array of {title, description, url, source} objects for recommended_resources
+-- p_topics: error topics recorded on every resource row
+CREATE OR REPLACE FUNCTION save_midterm_with_resources(
+    p_analysis JSONB,
+    p_resources JSONB,
+    p_topics TEXT[]
+)
+RETURNS UUID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    v_id UUID;
+BEGIN
+    INSERT INTO midterm_analyses (
+        user_id, filename, course_name, errors, extracted_text,
+        recommended_resources, error_topics, total_errors, correct_count,
+        wrong_count, partially_correct_count, total_marks_received, total_marks_possible
+    )
+    SELECT
+        user_id, filename, course_name, errors, extracted_text,
+        recommended_resources, error_topics, total_errors, correct_count,
+        wrong_count, partially_correct_count, total_marks_received, total_marks_possible
+    FROM jsonb_populate_record(NULL::midterm_analyses, p_analysis)
+    RETURNING id INTO v_id;
+
+    -- Rows missing a title or url are skipped rather than failing the whole save
+    INSERT INTO recommended_resources (user_id, title, description, url, topics, source)
+    SELECT
+        (p_analysis->>'user_id')::UUID, r.title, r.description, r.url, p_topics,
+        COALESCE(r.source, 'Perplexity')
+    FROM jsonb_to_recordset(COALESCE(p_resources, '[]'::jsonb))
+        AS r(title TEXT, description TEXT, url TEXT, source TEXT)
+    WHERE r.title IS NOT NULL AND r.url IS NOT NULL;
+
+    RETURN v_id;
+END;
+$$;
+
+GRANT EXECUTE ON FUNCTION save_midterm_with_resources(JSONB, JSONB, TEXT[]) TO authenticated, service_role;
+
+COMMENT ON FUNCTION save_midterm_with_resources(JSONB, JSONB, TEXT[]) IS 'Inserts a midterm analysis and its recommended resources atomically; returns the analysis id';
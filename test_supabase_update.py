@@ -20,55 +20,61 @@ async def test_update():
         return
     
     client = create_client(supabase_url, supabase_key)
-    
-    # Test 1: Check if we can read quiz_results
-    print("📖 Testing READ access...")
+    # All three checks go through the same PostgREST session, so the TCP/TLS
+    # connection from the first request is kept alive and reused by the rest
     try:
-        result = client.table("quiz_results").select("*").limit(1).execute()
-        print(f"✅ READ works - Found {len(result.data)} results")
-        if result.data:
-            print(f"   Sample result ID: {result.data[0].get('id')}")
-    except Exception as e:
-        print(f"❌ READ failed: {str(e)}")
-        return
+        # Test 1: Check if we can read quiz_results
+        print("📖 Testing READ access...")
+        try:
+            result = client.table("quiz_results").select("*").limit(1).execute()
+            print(f"✅ READ works - Found {len(result.data)} results")
+            if result.data:
+                print(f"   Sample result ID: {result.data[0].get('id')}")
+        except Exception as e:
+            print(f"❌ READ failed: {str(e)}")
+            return
     
-    # Test 2: Check if we can update (need a real user_id and result_id)
-    print("\n📝 Testing UPDATE access...")
-    if result.data:
-        test_result = result.data[0]
-        test_id = test_result.get("id")
-        test_user_id = test_result.get("user_id")
+        # Test 2: Check if we can update (need a real user_id and result_id)
+        print("\n📝 Testing UPDATE access...")
+        if result.data:
+            test_result = result.data[0]
+            test_id = test_result.get("id")
+            test_user_id = test_result.get("user_id")
         
-        update_data = {
-            "correct_count": test_result.get("correct_count") or 5,
-            "wrong_count": test_result.get("wrong_count") or 2,
-        }
+            update_data = {
+                "correct_count": test_result.get("correct_count") or 5,
+                "wrong_count": test_result.get("wrong_count") or 2,
+            }
         
-        try:
-            update_result = client.table("quiz_results").update(update_data).eq(
-                "id", test_id
-            ).eq("user_id", test_user_id).execute()
+            try:
+                update_result = client.table("quiz_results").update(update_data).eq(
+                    "id", test_id
+                ).eq("user_id", test_user_id).execute()
             
-            if update_result.data:
-                print(f"✅ UPDATE works - Updated result ID: {test_id}")
-                print(f"   Updated fields: {list(update_data.keys())}")
-            else:
-                print(f"⚠️  UPDATE returned no data - might be RLS blocking")
-        except Exception as e:
-            print(f"❌ UPDATE failed: {str(e)}")
-            print(f"   This might be an RLS (Row Level Security) issue")
-            print(f"   Check your RLS policies in Supabase")
-    else:
-        print("⚠️  No quiz results found to test UPDATE")
+                if update_result.data:
+                    print(f"✅ UPDATE works - Updated result ID: {test_id}")
+                    print(f"   Updated fields: {list(update_data.keys())}")
+                else:
+                    print(f"⚠️  UPDATE returned no data - might be RLS blocking")
+            except Exception as e:
+                print(f"❌ UPDATE failed: {str(e)}")
+                print(f"   This might be an RLS (Row Level Security) issue")
+                print(f"   Check your RLS policies in Supabase")
+        else:
+            print("⚠️  No quiz results found to test UPDATE")
     
-    # Test 3: Check RLS policies
-    print("\n🔒 Checking RLS policies...")
-    try:
-        # Try to query policy information (if accessible)
-        policies = client.table("quiz_results").select("*").limit(0).execute()
-        print("✅ Table is accessible")
-    except Exception as e:
-        print(f"❌ Table access issue: {str(e)}")
+        # Test 3: Check RLS policies
+        print("\n🔒 Checking RLS policies...")
+        try:
+            # Try to query policy information (if accessible)
+            policies = client.table("quiz_results").select("*").limit(0).execute()
+            print("✅ Table is accessible")
+        except Exception as e:
+            print(f"❌ Table access issue: {str(e)}")
+    finally:
+        # Close the pooled connections so the socket isn't left open at exit
+        client.postgrest.session.close()
+
 
 if __name__ == "__main__":
     asyncio.run(test_update())